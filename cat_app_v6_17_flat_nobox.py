@@ -1,12 +1,12 @@
 # -*- coding: utf-8 -*-
 import math
-import hashlib
-import base64
-import random
 import pandas as pd
 import streamlit as st
 from pathlib import Path
 
+from gamja import (ALLERGY_SYNONYMS, SHOP_BUTTON, CatalogIndex, LRUCache, assets, card_grid, card_html,
+                   catalog, estimate_daily_kcal, life_stage, profile_query, recommend, with_reasons)
+
 # --- Shop link helpers ---
 from urllib.parse import quote_plus
 
@@ -29,30 +29,12 @@ def build_shop_links(row):
 
 
 
-# --- Cute cat icon thumbnails (fallback) ---
-CAT_ICONS = [
-    "https://cdn-icons-png.flaticon.com/512/616/616408.png",
-    "https://cdn-icons-png.flaticon.com/512/616/6164089.png",
-    "https://cdn-icons-png.flaticon.com/512/616/6164086.png",
-    "https://cdn-icons-png.flaticon.com/512/1998/1998610.png",
-    "https://cdn-icons-png.flaticon.com/512/870/870910.png"
-]
-
-def resolve_thumb(row):
-    u = str(row.get('image_url') or row.get('thumbnail_url') or '').strip()
-    # if row's image is a valid http and not an obvious placeholder, use it
-    bad = ['example.com', 'picsum.photos', 'placeholder']
-    if u.startswith('http') and not any(b in u for b in bad):
-        return u
-    # otherwise return a cute random cat icon
-    return random.choice(CAT_ICONS)
-
 st.set_page_config(page_title="집사 밥상", page_icon="🐾", layout="wide")
 
 # ----------------- Cute & Clean Global Styles -----------------
-st.markdown("""
-<style>
-@import url('https://fonts.googleapis.com/css2?family=Gowun+Dodum&display=swap');
+STATIC_DIR = Path(__file__).parent / "static"  # 로고 변형·아이콘
+
+APP_CSS = assets.font_css() + """
 html, body {background: #FFF9F2;}
 .block-container {padding-top: 2.2rem; padding-bottom: 2rem;}
 
@@ -65,6 +47,7 @@ html, body {background: #FFF9F2;}
   border: 1px solid #F5D9C8;
   filter: drop-shadow(0 10px 22px rgba(248, 184, 139, .35));
 }
+.logo-wrap picture {display:flex;}
 .brand-logo {width:78px; height:78px; border-radius:18px; object-fit:contain; background:#fff;}
 .brand-title {font-weight:900; letter-spacing:.02em; font-size: 2rem; color:#3d3d3d; margin: .5rem 0 0 0;}
 .brand-sub {color:#7a6b5f; font-size:.95rem; margin-top:.12rem;}
@@ -350,130 +333,69 @@ html, body {background: #FFF9F2;}
   box-shadow: none !important;
 }
 
-</style>
-""", unsafe_allow_html=True)
+/* --- Result cards: one markdown element per card, buttons in the same column --- */
+.card-cell {min-width:0;}
+.card-cell .note {padding:.75rem 1rem; border-radius:.5rem; margin:.5rem 0; font-size:.95rem;}
+.card-cell .note.ok {background:rgba(33, 195, 84, .1); color:#177233;}
+.card-cell .note.info {background:rgba(28, 131, 225, .1); color:#004280;}
+.card-cell details {margin:.35rem 0 .5rem; background:#FFF8F1; border:1px solid #F4DCC5; border-radius:14px;}
+.card-cell summary {padding:.5rem .75rem; color:#5f3b23; font-weight:600; cursor:pointer;}
+.card-cell details > div {padding:.35rem .75rem .65rem;}
+"""
+
+# 전역 CSS 는 인라인 <style> 로 보낸다. 같은 세션에서 다시 실행할 때는 Streamlit 이 똑같은 메시지를
+# 해시 참조로만 보낸다 (.streamlit/config.toml 의 global.minCachedMessageSize).
+st.markdown(assets.style_tag(APP_CSS), unsafe_allow_html=True)
 
 # ----------------- Data Loader -----------------
-@st.cache_data
+@st.cache_resource
 def load_catalog(path):
-    df = pd.read_csv(path)
-    text_cols = ["brand","name","type","texture","protein","ingredients","price_tier","tags","category","country","product_url","image_url","availability_region","sku"]
-    for c in text_cols:
-        if c in df.columns:
-            df[c] = df[c].astype(str).fillna("")
-    num_cols = ["moisture_pct","kcal_per_100g","magnesium_mg_per_100kcal","phosphorus_pct_dm","sodium_pct_dm",
-                "crude_protein_pct_dm","crude_fat_pct_dm","crude_fiber_pct_dm","ash_pct_dm","omega3_pct_dm","calcium_pct_dm",
-                "package_size_g","price_krw","palatability_score","rating_count","treat_kcal_per_piece"]
-    for c in num_cols:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
-    for c in ["grain_free","single_protein","veterinary_diet","indoor_suitable","neutered_suitable"]:
-        if c in df.columns:
-            df[c] = df[c].astype(str).str.lower().isin(["true","1","y","yes"])
-    return df
+    # 정규화된 카탈로그는 CSV 옆 .catalog_cache/ 에 Feather 로 저장해 재사용.
+    # 카탈로그와 필터 비트맵 인덱스는 모든 세션이 읽기 전용으로 공유한다 (rerun 마다 복사 없음)
+    return CatalogIndex(catalog.load_catalog(path))
+
+@st.cache_resource(show_spinner=False)
+def shared_rank_cache():
+    # 즐겨찾기/비선호를 뺀 기본 순위를 모든 세션이 공유 (최대 256개·256MB, 30분)
+    return LRUCache(maxsize=256, ttl=1800, max_bytes=256 * 2**20)
 
 DEFAULT_PATHS = ["catalog.csv", "real_brands_catalog_max.csv"]
-data = None
+index = None
 for p in DEFAULT_PATHS:
     try:
-        data = load_catalog(p)
+        index = load_catalog(p)
         break
     except Exception:
         pass
 
-if data is None:
+if index is None:
     st.error("카탈로그 CSV를 찾지 못했어요. 폴더에 catalog.csv를 넣거나 파일 업로드를 사용하세요.")
     uploaded = st.file_uploader("카탈로그 CSV 업로드", type=["csv"])
     if uploaded:
-        data = load_catalog(uploaded)
+        index = load_catalog(uploaded)
     else:
         st.stop()
-
-# ----------------- Helpers -----------------
-ALLERGY_SYNONYMS = {
-    "닭": ["닭","치킨","계육","chicken"],
-    "소": ["소","소고기","비프","beef"],
-    "어류": ["어류","생선","연어","참치","고등어","fish","salmon","tuna","mackerel"],
-    "오리": ["오리","duck"],
-    "양": ["양","램","양고기","lamb"],
-    "칠면조": ["칠면조","터키","turkey"],
-    "계란": ["계란","달걀","egg"],
-    "유제품": ["우유","유청","치즈","lactose","milk","whey"],
-    "곡물": ["밀","보리","옥수수","글루텐","wheat","corn","gluten"]
-}
-
-def expand_allergy_terms(tokens):
-    expanded = set()
-    for t in tokens:
-        t = t.strip().lower()
-        if not t:
-            continue
-        expanded.add(t)
-        for syns in ALLERGY_SYNONYMS.values():
-            low = [s.lower() for s in syns]
-            if t in low:
-                expanded.update(low)
-    return expanded
-
-def life_stage(age):
-    try:
-        a = float(age)
-    except Exception:
-        a = 3.0
-    return "키튼" if a < 1 else ("어덜트" if a < 10 else "시니어")
-
-def estimate_daily_kcal(weight, activity, neutered, stage):
-    try:
-        w = max(0.5, float(weight))
-    except Exception:
-        w = 4.0
-    rer = 70 * (w ** 0.75)
-    factor = 1.0
-    if neutered == "예":
-        factor -= 0.05
-    if activity == "낮음":
-        factor -= 0.1
-    elif activity == "높음":
-        factor += 0.15
-    if stage == "키튼":
-        factor += 0.25
-    elif stage == "시니어":
-        factor -= 0.05
-    return max(120, int(round(rer * factor)))
+data = index.data
 
 # ----------------- State -----------------
 if "step" not in st.session_state:
     st.session_state.update(step=1, form={}, favorites=set(), dislikes=set(), page=1, per_page=9)
 
-def item_id(row):
-    base = str(row.get("sku") or row.get("name") or f"{row.get('brand')}_{row.get('product_url')}")
-    h = hashlib.md5(base.encode("utf-8")).hexdigest()[:8]
-    return f"{base}-{h}"
-
-# --- Logo util: embed local file as data URI ---
-def _logo_data_uri():
-    candidates = []
-    try:
-        candidates.append(Path(__file__).parent / "cheese_cat_logo.png")
-    except NameError:
-        pass
-    candidates.append(Path("cheese_cat_logo.png"))
-    for p in candidates:
-        if p.exists():
-            mime = "image/png" if p.suffix.lower() in [".png",".apng"] else "image/jpeg"
-            b64 = base64.b64encode(p.read_bytes()).decode("ascii")
-            return f"data:{mime};base64,{b64}"
-    return None
+# --- Logo: small PNG/WebP copies served from ./static/logo (server.enableStaticServing) ---
+@st.cache_resource(show_spinner=False)
+def _logo_img():
+    sources = [Path(__file__).parent / "cheese_cat_logo.png", Path("cheese_cat_logo.png")]
+    return assets.logo_html(sources, STATIC_DIR, st.get_option("server.enableStaticServing"))
 
 # ----------------- STEP 1: Hero + Form -----------------
 if st.session_state.step == 1:
-    logo_src = _logo_data_uri() or "https://picsum.photos/seed/cat/96/96"
+    logo_img = _logo_img() or f'<img class="brand-logo" src="{assets.static_url(STATIC_DIR, "icons/cat.svg")}" alt="logo"/>'
     brand_name = "집사 밥상"
 
     st.markdown(f"""
     <div class="brand-hero">
         <div class="logo-wrap">
-            <img class="brand-logo" src="{logo_src}" alt="logo"/>
+            {logo_img}
         </div>
         <div class="brand-title">{brand_name}</div>
         <div class="brand-sub">오늘도 우리 고양이를 위한 한 끼 💕</div>
@@ -503,14 +425,22 @@ if st.session_state.step == 1:
             custom_allergy = st.text_input("기타 알러지(쉼표 , 로 구분)", key="f_custom_allergy")
 
         st.markdown("### 3) 기본 필터")
-        brands = ["전체"] + sorted([b for b in data["brand"].dropna().unique() if b])
-        sel_brands = st.multiselect("브랜드", brands, default=["전체"], key="f_sel_brands")
+        def with_count(col):
+            # 선택지마다 해당 제품 수를 함께 표시 (비트맵 popcount)
+            counts = index.facet_counts(col)
+            return lambda v: f"{v} ({index.n if v == '전체' else counts.get(v, 0)})"
+        brands = ["전체"] + sorted([b for b in index.facets.get("brand", {}) if b])
+        sel_brands = st.multiselect("브랜드", brands, default=["전체"], key="f_sel_brands",
+                                    format_func=with_count("brand"))
         price_opts = ["전체","저가","중간","프리미엄"]
-        sel_prices = st.multiselect("가격대", price_opts, default=["전체"], key="f_sel_prices")
+        sel_prices = st.multiselect("가격대", price_opts, default=["전체"], key="f_sel_prices",
+                                    format_func=with_count("price_tier"))
         textures = ["전체","드라이","습식/파우치"]
-        sel_textures = st.multiselect("형태", textures, default=["전체"], key="f_sel_textures")
+        sel_textures = st.multiselect("형태", textures, default=["전체"], key="f_sel_textures",
+                                      format_func=with_count("texture"))
         proteins = ["전체","닭","어류","소","오리","양","칠면조"]
-        sel_proteins = st.multiselect("단백질", proteins, default=["전체"], key="f_sel_proteins")
+        sel_proteins = st.multiselect("단백질", proteins, default=["전체"], key="f_sel_proteins",
+                                      format_func=with_count("protein"))
 
         submitted = st.form_submit_button("다음 단계 → 추천 보기", use_container_width=True)
         if submitted:
@@ -548,14 +478,9 @@ if st.session_state.step == 2:
         view = st.radio("보기", ["카드형", "표형"], horizontal=True, index=0, key="view_mode")
     st.markdown('</div>', unsafe_allow_html=True)
 
-    # 알러지 확장
-    custom_tokens = [t.strip() for t in f.get("custom_allergy","").split(",") if t.strip()]
-    allergies = set([a.lower() for a in f.get("base_allergy",[])]) | set([t.lower() for t in custom_tokens])
-    expanded = expand_allergy_terms(allergies)
-
     with st.sidebar:
         st.header("🔎 추가 필터")
-        price_series = data.get("price_krw", pd.Series([0])).fillna(0)
+        price_series = pd.Series(index.bounds("price_krw") or [0])  # 정렬 인덱스의 양 끝값 (결측=0원)
         try:
             min_price = int(price_series.min())
             max_price = int(max(price_series.max(), 100000))
@@ -564,8 +489,8 @@ if st.session_state.step == 2:
         if min_price > max_price:
             min_price, max_price = 0, 100000
         price_range = st.slider("가격(원)", min_value=min_price, max_value=max_price, value=(min_price, max_price))
-        only_grain_free = st.checkbox("그레인프리만", value=False)
-        only_vet_diet   = st.checkbox("수의학적 처방식만", value=False)
+        only_grain_free = st.checkbox(f"그레인프리만 ({index.flag_count('grain_free')})", value=False)
+        only_vet_diet   = st.checkbox(f"수의학적 처방식만 ({index.flag_count('veterinary_diet')})", value=False)
 
         sort_key = st.selectbox("정렬 기준", ["추천순(점수)", "가격 낮은순", "가격 높은순", "kcal 낮은순", "kcal 높은순"], index=0)
         per_page = st.number_input("페이지당 카드 수", 6, 30, st.session_state.per_page)
@@ -578,109 +503,19 @@ if st.session_state.step == 2:
             st.session_state.step = 1
             st.rerun()
 
-    def selected_or_all(selected, all_values, all_label="전체"):
-        if (not selected) or (all_label in selected):
-            return list(all_values)
-        return [x for x in selected if x != all_label]
-
-    # 필터링
-    df = data.copy()
-    brands_all = sorted([b for b in data["brand"].dropna().unique() if b])
-    selected_brands = selected_or_all(f.get("sel_brands", []), brands_all)
-    if selected_brands:
-        df = df[df["brand"].isin(selected_brands)]
-    price_all = ["저가","중간","프리미엄"]
-    selected_prices = selected_or_all(f.get("sel_prices", []), price_all)
-    if selected_prices:
-        df = df[df["price_tier"].isin(selected_prices)]
-    texture_all = ["드라이","습식/파우치"]
-    selected_textures = selected_or_all(f.get("sel_textures", []), texture_all)
-    if selected_textures:
-        df = df[df["texture"].isin(selected_textures)]
-    protein_all = ["닭","어류","소","오리","양","칠면조"]
-    selected_proteins = selected_or_all(f.get("sel_proteins", []), protein_all)
-    if selected_proteins:
-        df = df[df["protein"].isin(selected_proteins)]
-    if "price_krw" in df.columns:
-        df = df[(df["price_krw"].fillna(0)>=price_range[0]) & (df["price_krw"].fillna(0)<=price_range[1])]
-    if only_grain_free and "grain_free" in df.columns:
-        df = df[df["grain_free"]==True]
-    if only_vet_diet and "veterinary_diet" in df.columns:
-        df = df[df["veterinary_diet"]==True]
-
-    # 스코어링
-    def score_row(row):
-        score, reasons = 0.0, []
-        if row.get("price_tier") in selected_prices:
-            score += 0.5; reasons.append(f"{row.get('price_tier')} 가격")
-        if row.get("texture") in selected_textures:
-            score += 0.5; reasons.append(f"{row.get('texture')} 형태")
-        if row.get("protein") in selected_proteins:
-            score += 0.5; reasons.append(f"{row.get('protein')} 단백질")
-
-        tags = set(str(row.get("tags","")).split(";"))
-        stage_local = stage
-        if stage_local == "키튼" and "키튼" in tags: score += 1.5; reasons.append("키튼용")
-        if stage_local == "시니어" and "시니어" in tags: score += 1.5; reasons.append("시니어용")
-
-        kcal100 = row.get("kcal_per_100g")
-        moisture = row.get("moisture_pct")
-        mg100kcal = row.get("magnesium_mg_per_100kcal")
-        phosphorus = row.get("phosphorus_pct_dm")
-        sodium = row.get("sodium_pct_dm")
-
-        if "비만 경향" in f.get("conditions", []) and pd.notna(kcal100) and kcal100 <= 330:
-            score += 1.5; reasons.append("저칼로리")
-        if "FLUTD/요로기계" in f.get("conditions", []):
-            if (isinstance(row.get("texture",""), str) and str(row.get("texture","")).startswith("습식")) or (pd.notna(moisture) and moisture >= 70):
-                score += 1.5; reasons.append("높은 수분")
-            if pd.notna(mg100kcal) and mg100kcal <= 25:
-                score += 1.0; reasons.append("Mg 낮음")
-        if "신장 질환(CKD)" in f.get("conditions", []):
-            if pd.notna(phosphorus) and phosphorus <= 0.6:
-                score += 1.0; reasons.append("낮은 인")
-            if pd.notna(sodium) and sodium <= 0.4:
-                score += 0.8; reasons.append("적절한 Na")
-        if "소화 민감성/IBD" in f.get("conditions", []) and "소화 민감성" in tags:
-            score += 1.0; reasons.append("소화에 순함")
-        if "헤어볼" in f.get("conditions", []) and "헤어볼" in tags:
-            score += 1.0; reasons.append("헤어볼 관리")
-        if f.get("activity")=="높음" and pd.notna(kcal100) and kcal100>=360:
-            score += 0.7; reasons.append("활동량 높음 적합")
-        if "고단백" in tags:
-            score += 0.6; reasons.append("고단백")
-
-        blob = " ".join([str(row.get("name","")), str(row.get("protein","")), str(row.get("ingredients",""))]).lower()
-        expanded_all = expanded
-        if any(a in blob for a in expanded_all):
-            score -= 5; reasons.append("알러지 의심 성분")
-
-        _id = item_id(row)
-        if _id in st.session_state.dislikes:
-            score -= 2; reasons.append("비선호 항목")
-        if _id in st.session_state.favorites:
-            score += 0.5; reasons.append("즐겨찾기 가산")
-        return score, reasons
-
-    scores, reasons_all = [], []
-    for _, r in df.iterrows():
-        s, rs = score_row(r); scores.append(s); reasons_all.append(rs)
-    df = df.assign(score=scores, reasons=reasons_all)
-
-    # 정렬
-    if sort_key == "추천순(점수)":
-        df = df.sort_values("score", ascending=False)
-    elif sort_key == "가격 낮은순":
-        df = df.sort_values("price_krw", ascending=True, na_position="last")
-    elif sort_key == "가격 높은순":
-        df = df.sort_values("price_krw", ascending=False, na_position="last")
-    elif sort_key == "kcal 낮은순":
-        df = df.sort_values("kcal_per_100g", ascending=True, na_position="last")
-    elif sort_key == "kcal 높은순":
-        df = df.sort_values("kcal_per_100g", ascending=False, na_position="last")
-
-    # UI 탭
-    tab_food, tab_treat, tab_favs, tab_dislikes, tab_table = st.tabs(["🍽 사료 추천", "🍘 간식 추천", "⭐ 즐겨찾기", "🚫 비선호", "📋 전체 표"])
+    # 폼 → 조건(알러지 동의어 그룹, "전체" 선택 펼치기 포함)은 API·배치와 같은 profile_query 로 만든다.
+    # 필터링(비트맵) → 스코어링(컬럼 연산) → 정렬. 같은 조건의 rerun(페이지 이동 등)은
+    # 세션별 LRU 캐시에 남은 순위를 그대로 쓴다 ("전체"·선택 순서가 달라도 같은 조건이면 같은 키).
+    # 즐겨찾기/비선호를 뺀 기본 순위는 모든 세션이 공유하고, 세션별 가감점만 그 위에 더한다
+    if "rank_cache" not in st.session_state:
+        # 즐겨찾기/비선호를 누를 때마다 키가 바뀌어 항목이 늘므로 크기로도 제한한다 (최대 16개·64MB, 10분)
+        st.session_state.rank_cache = LRUCache(maxsize=16, ttl=600, max_bytes=64 * 2**20)
+    query = dict(profile_query(index, f), price_range=price_range,
+                 grain_free=only_grain_free, vet_diet=only_vet_diet, sort_key=sort_key)
+
+    # 카드 버튼·페이지 이동은 콜백에서 상태만 바꾸고, 다시 그리는 것은 결과 영역(fragment) 하나뿐이다
+    def _turn_page(step, total_pages):
+        st.session_state.page = min(total_pages, max(1, st.session_state.page + step))
 
     def _paginate(total_count, key_prefix="pg"):
         per_page = st.session_state.per_page
@@ -690,13 +525,11 @@ if st.session_state.step == 2:
             st.write(f"페이지 {st.session_state.page} / {total_pages}")
         col_prev, col_next = c1, c3
         with col_prev:
-            if st.button("이전", key=f"prev_{key_prefix}", disabled=st.session_state.page<=1):
-                st.session_state.page = max(1, st.session_state.page - 1)
-                st.rerun()
+            st.button("이전", key=f"prev_{key_prefix}", disabled=st.session_state.page<=1,
+                      on_click=_turn_page, args=(-1, total_pages))
         with col_next:
-            if st.button("다음", key=f"next_{key_prefix}", disabled=st.session_state.page>=total_pages):
-                st.session_state.page = min(total_pages, st.session_state.page + 1)
-                st.rerun()
+            st.button("다음", key=f"next_{key_prefix}", disabled=st.session_state.page>=total_pages,
+                      on_click=_turn_page, args=(1, total_pages))
         start = (st.session_state.page-1)*per_page
         end = start + per_page
         return start, end
@@ -712,106 +545,61 @@ if st.session_state.step == 2:
             return
 
         # 카드형 + 페이지네이션
-        sub_top = sub.head(maxn).reset_index(drop=True)
+        sub_top = sub.head(maxn)
+        top_ids = index.item_ids_of(sub_top)  # 카탈로그 로드 시 계산해 둔 item_id
         start, end = _paginate(len(sub_top), key_prefix=key_prefix)
-        show = sub_top.iloc[start:end]
-
-        cols = st.columns(3)
-        for i, row in show.iterrows():
-            _id = item_id(row)
-            with cols[i % 3]:
-                with st.container():
-                    st.markdown('<div class="card">', unsafe_allow_html=True)
-                    # Title at top with line break for 습식/파우치
-                    display_name = str(row.get('name','(이름 없음)'))
-                    if '습식/파우치' in display_name:
-                        display_name = display_name.replace('습식/파우치', "습식<br/><span class='title-sub'>파우치</span>")
-                    st.markdown(f"<h3>{display_name}</h3>", unsafe_allow_html=True)
-                    # Meta
-                    st.markdown(f"<div class='meta'>브랜드: {row.get('brand','')} · 형태: {row.get('texture','')} · 단백질: {row.get('protein','')}</div>", unsafe_allow_html=True)
-                    price_val = row.get('price_krw')
-                    price_str = f"{int(price_val):,}원" if pd.notna(price_val) else "정보없음"
-                    st.write(f"점수: **{round(float(row.get('score',0)),2)}** · 가격대: **{row.get('price_tier','')}** · 가격: {price_str}")
-
-                    kcal100 = row.get("kcal_per_100g")
-                    if not is_treat and pd.notna(kcal100) and kcal100>0:
-                        grams = int(round(daily_kcal / kcal100 * 100))
-                        st.success(f"권장 1일 급여량: **약 {grams} g/일**")
-                    if is_treat:
-                        budget = int(daily_kcal*0.1)
-                        per_piece = row.get("treat_kcal_per_piece")
-                        if pd.notna(per_piece) and per_piece and per_piece>0:
-                            count = max(1, budget//int(per_piece))
-                            st.info(f"간식 한도 ≈ {budget} kcal → **하루 {count}개** (1개당 {int(per_piece)} kcal)")
-                        else:
-                            st.info(f"간식 한도 ≈ {budget} kcal · (CSV에 treat_kcal_per_piece를 넣으면 개수 계산)")
-
-                    tags = [t for t in str(row.get("tags","")).split(";") if t]
-                    if tags:
-                        st.markdown("".join([f"<span class='pill tag'>{t}</span>" for t in tags]), unsafe_allow_html=True)
-
-                    # 추천 이유는 접기/펼치기
-                    if row.get("reasons"):
-                        with st.expander("추천 이유 보기"):
-                            st.markdown("".join([f"<span class='pill reason'>{r}</span>" for r in row["reasons"]]), unsafe_allow_html=True)
-
-                    product_url = row.get("product_url","")
-                    if isinstance(product_url, str) and product_url.startswith("http"):
-                        st.markdown(f'''<a href="{product_url}" target="_blank" rel="noopener noreferrer" style="display:inline-block; text-decoration:none; background:#FFF5EE; border:1px solid #F2CDAE; padding:8px 14px; border-radius:22px; color:#5f3b23; font-weight:700; font-size:0.9rem;">🛒 상품 보기</a>''', unsafe_allow_html=True)
-
-                    if show_actions:
-                        c1, c2, c3 = st.columns(3)
-                        with c1:
-                            if st.button(("★ 즐겨찾기 해제" if _id in st.session_state.favorites else "⭐ 즐겨찾기"), key=f"fav_{_id}"):
-                                if _id in st.session_state.favorites:
-                                    st.session_state.favorites.remove(_id)
-                                else:
-                                    st.session_state.favorites.add(_id)
-                                st.rerun()
-                        with c2:
-                            if st.button(("비선호 해제" if _id in st.session_state.dislikes else "🚫 비선호"), key=f"dis_{_id}"):
-                                if _id in st.session_state.dislikes:
-                                    st.session_state.dislikes.remove(_id)
-                                else:
-                                    st.session_state.dislikes.add(_id)
-                                    if _id in st.session_state.favorites:
-                                        st.session_state.favorites.remove(_id)
-                                st.rerun()
-                        with c3:
-                            if st.button("🧹 숨기기", key=f"hide_{_id}"):
-                                st.session_state.dislikes.add(_id)
-                                if _id in st.session_state.favorites:
-                                    st.session_state.favorites.remove(_id)
-                                st.rerun()
-                    st.markdown('</div>', unsafe_allow_html=True)
-
-    with tab_food:
-        render_cards(df[df.get("type")=="사료"], is_treat=False, maxn=int(topn_food), key_prefix="food")
-    with tab_treat:
-        render_cards(df[df.get("type")=="간식"], is_treat=True, maxn=int(topn_treat), key_prefix="treat")
-
-    with tab_favs:
-        fav_df = df[df.apply(lambda r: item_id(r) in st.session_state.favorites, axis=1)]
-        render_cards(fav_df, is_treat=False, maxn=len(fav_df) if len(fav_df)>0 else 0, show_actions=True, key_prefix="favs")
-
-    with tab_dislikes:
-        dis_df = df[df.apply(lambda r: item_id(r) in st.session_state.dislikes, axis=1)]
-        render_cards(dis_df, is_treat=False, maxn=len(dis_df) if len(dis_df)>0 else 0, show_actions=True, key_prefix="dis")
-
-    with tab_table:
-        # 컬럼 구성 깔끔화
-        st.dataframe(
-            df[["brand","name","type","texture","protein","price_tier","price_krw","kcal_per_100g","score","tags"]],
-            use_container_width=True
-        )
-
-    st.markdown("---")
-    colx, coly = st.columns(2)
-    with colx:
-        st.download_button("⭐ 즐겨찾기 목록 CSV 다운로드",
-                           df[df.apply(lambda r: item_id(r) in st.session_state.favorites, axis=1)].to_csv(index=False).encode('utf-8-sig'),
-                           "favorites.csv", "text/csv")
-    with coly:
-        st.download_button("🚫 비선호 목록 CSV 다운로드",
-                           df[df.apply(lambda r: item_id(r) in st.session_state.dislikes, axis=1)].to_csv(index=False).encode('utf-8-sig'),
-                           "dislikes.csv", "text/csv")
+        show_ids = top_ids[start:end]
+        cards = [card_html(row, daily_kcal, is_treat, price=True, pouch_title=True,
+                           feed_label="권장 1일 급여량", reasons="details", link=SHOP_BUTTON)
+                 for row in with_reasons(sub_top.iloc[start:end]).to_dict("records")]
+
+        # 카드마다 그 열 안에 버튼을 붙인다 (좁은 화면에서 열이 세로로 쌓여도 카드와 버튼이 함께 간다)
+        card_grid(st, cards, show_ids, st.session_state, key_prefix, show_actions)
+
+    @st.fragment
+    def render_results(query):
+        # 즐겨찾기/비선호/숨기기·페이지 버튼은 이 영역만 다시 실행한다 (CSS·요약·사이드바는 그대로).
+        # 순위는 공유 기본 순위에 이 세션의 가감점만 더한 캐시에서 바로 나온다
+        ranking = recommend(index, cache=st.session_state.rank_cache, shared_cache=shared_rank_cache(), **query,
+                            favorites=st.session_state.favorites, dislikes=st.session_state.dislikes)
+        # 카드 탭은 상위 N개만 부분 선택(argpartition)하고, 전체 정렬은 전체 표에서만 쓴다
+        is_food = ranking.mask(index, index.any_of("type", ["사료"]))
+        is_treat = ranking.mask(index, index.any_of("type", ["간식"]))
+
+        # UI 탭
+        tab_food, tab_treat, tab_favs, tab_dislikes, tab_table = st.tabs(["🍽 사료 추천", "🍘 간식 추천", "⭐ 즐겨찾기", "🚫 비선호", "📋 전체 표"])
+
+        with tab_food:
+            render_cards(ranking.frame(index, top=int(topn_food), where=is_food),
+                         is_treat=False, maxn=int(topn_food), key_prefix="food")
+        with tab_treat:
+            render_cards(ranking.frame(index, top=int(topn_treat), where=is_treat),
+                         is_treat=True, maxn=int(topn_treat), key_prefix="treat")
+
+        with tab_favs:
+            fav_df = ranking.frame(index, where=ranking.with_ids(index, st.session_state.favorites))
+            render_cards(fav_df, is_treat=False, maxn=len(fav_df) if len(fav_df)>0 else 0, show_actions=True, key_prefix="favs")
+
+        with tab_dislikes:
+            dis_df = ranking.frame(index, where=ranking.with_ids(index, st.session_state.dislikes))
+            render_cards(dis_df, is_treat=False, maxn=len(dis_df) if len(dis_df)>0 else 0, show_actions=True, key_prefix="dis")
+
+        with tab_table:
+            # 컬럼 구성 깔끔화
+            st.dataframe(
+                ranking.frame(index)[["brand","name","type","texture","protein","price_tier","price_krw","kcal_per_100g","score","tags"]],
+                use_container_width=True
+            )
+
+        st.markdown("---")
+        colx, coly = st.columns(2)
+        with colx:
+            st.download_button("⭐ 즐겨찾기 목록 CSV 다운로드",
+                               with_reasons(fav_df).to_csv(index=False).encode('utf-8-sig'),
+                               "favorites.csv", "text/csv")
+        with coly:
+            st.download_button("🚫 비선호 목록 CSV 다운로드",
+                               with_reasons(dis_df).to_csv(index=False).encode('utf-8-sig'),
+                               "dislikes.csv", "text/csv")
+
+    render_results(query)
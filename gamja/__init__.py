@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Recommendation core shared by the 집사 밥상 Streamlit apps.
+
+Headless: nothing here imports streamlit, so the same code serves the apps,
+scripts and workers.  The names below are resolved from their submodules on
+first use, so ``import gamja`` stays cheap; numpy/pandas are only loaded
+with the first catalog, index or scoring name.
+"""
+import importlib
+
+_EXPORTS = {
+    "ALLERGY_SYNONYMS": "allergy", "AllergyText": "allergy", "resolve_allergies": "allergy",
+    "data_uri": "assets", "font_css": "assets", "image_variants": "assets", "logo_html": "assets",
+    "offline": "assets", "static_url": "assets", "style_tag": "assets",
+    "LRUCache": "cache",
+    "SHOP_BUTTON": "cards", "SHOP_LINK": "cards", "card_grid": "cards", "card_html": "cards",
+    "load_catalog": "catalog",
+    "apply_filters": "filters", "filter_bitmap": "filters", "filter_mask": "filters",
+    "selected_or_all": "filters",
+    "CatalogIndex": "index",
+    "rank_many": "matrix",
+    "estimate_daily_kcal": "nutrition", "grams_per_day": "nutrition", "life_stage": "nutrition",
+    "pieces_per_day": "nutrition", "treat_budget": "nutrition",
+    "allergy_tokens": "profile", "daily_kcal": "profile", "profile_query": "profile",
+    "Ranking": "recommend", "canonical_query": "recommend", "personalize_table": "recommend",
+    "query_fingerprint": "recommend", "rank": "recommend", "recommend": "recommend", "top_k": "recommend",
+    "decode_reasons": "scoring", "score_frame": "scoring", "score_rows": "scoring", "with_reasons": "scoring",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    submodule = importlib.import_module(f".{module}", __name__)
+    if _EXPORTS.get(module) == module:
+        # importing the submodule bound it on the package; the export of the same name wins
+        globals()[module] = getattr(submodule, module)
+    value = getattr(submodule, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
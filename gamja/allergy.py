@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Allergy synonym groups and the text the allergy rule searches.
+
+The allergy rule flags a product when one of the user's allergy terms occurs
+in its lower-cased "name protein ingredients" text.  That text is built and
+factorised once per catalog (:class:`AllergyText`), and for every group of
+``ALLERGY_SYNONYMS`` the distinct texts containing one of its terms are
+found at load time, so the common allergies the form offers never scan the
+catalog.  Only free-text terms that belong to no group are searched per
+request, with one compiled pattern over the distinct texts.
+
+User tokens and catalog text are normalised the same way (NFC, collapsed
+whitespace, lower case), and every synonym is looked up in a reverse map
+built once at import.  Extra synonyms can be kept in a JSON file of the same
+shape as ``ALLERGY_SYNONYMS`` (``{"그룹": ["동의어", ...]}``): the file named
+by ``GAMJA_ALLERGY_SYNONYMS``, or ``allergy_synonyms.json`` in the working
+directory, is merged in at import; :func:`load_synonyms` merges another one
+later.
+"""
+import json
+import os
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+ALLERGY_SYNONYMS = {
+    "닭": ["닭","치킨","계육","chicken"],
+    "소": ["소","소고기","비프","beef"],
+    "어류": ["어류","생선","연어","참치","고등어","fish","salmon","tuna","mackerel"],
+    "오리": ["오리","duck"],
+    "양": ["양","램","양고기","lamb"],
+    "칠면조": ["칠면조","터키","turkey"],
+    "계란": ["계란","달걀","egg"],
+    "유제품": ["우유","유청","치즈","lactose","milk","whey"],
+    "곡물": ["밀","보리","옥수수","글루텐","wheat","corn","gluten"]
+}
+ALLERGY_TEXT_COLS = ("name", "protein", "ingredients")
+SYNONYMS_ENV = "GAMJA_ALLERGY_SYNONYMS"
+SYNONYMS_FILE = "allergy_synonyms.json"
+
+# 정규화된 동의어 -> 그룹들, 그룹 -> 정규화된 검색어 (import 시 한 번 구성)
+_SYNONYM_GROUPS = {}
+_GROUP_TERMS = {}
+
+
+def normalize_token(text):
+    """NFC, single spaces and lower case: the form allergy terms are compared in."""
+    return " ".join(unicodedata.normalize("NFC", text).split()).lower()
+
+
+def _rebuild():
+    _SYNONYM_GROUPS.clear()
+    _GROUP_TERMS.clear()
+    for group, syns in ALLERGY_SYNONYMS.items():
+        terms = {normalize_token(t) for t in (group, *syns)} - {""}
+        _GROUP_TERMS[group] = frozenset(terms)
+        for t in terms:
+            _SYNONYM_GROUPS.setdefault(t, []).append(group)
+
+
+def load_synonyms(path):
+    """Merge a JSON synonym table into ``ALLERGY_SYNONYMS``.
+
+    Known groups get the extra synonyms, unknown ones are added as new groups.
+    Indexes built before the call keep the groups they were built with.
+    """
+    with open(path, encoding="utf-8") as fh:
+        extra = json.load(fh)
+    if not isinstance(extra, dict):
+        raise ValueError(f"{path}: expected an object of group -> synonym list")
+    for group, syns in extra.items():
+        if isinstance(syns, str) or not all(isinstance(s, str) for s in syns):
+            raise ValueError(f"{path}: synonyms of {group!r} must be a list of strings")
+        current = ALLERGY_SYNONYMS.setdefault(group, [])
+        current.extend(s for s in syns if s not in current)
+    _rebuild()
+
+
+def group_terms(group):
+    """Normalised search terms of a synonym group (the group name included)."""
+    return _GROUP_TERMS[group]
+
+
+def resolve_allergies(tokens):
+    """Split allergy tokens into synonym groups and remaining free-text terms.
+
+    A token naming a group or one of its synonyms selects the whole group;
+    anything else is kept as a literal (normalised) search term.
+    """
+    groups, terms = [], set()
+    for t in tokens:
+        t = normalize_token(t)
+        if not t:
+            continue
+        hits = _SYNONYM_GROUPS.get(t)
+        if not hits:
+            terms.add(t)
+            continue
+        for g in hits:
+            if g not in groups:
+                groups.append(g)
+    return groups, terms
+
+
+class AllergyText:
+    """Lower-cased allergy search text of a frame, factorised into codes + distinct texts.
+
+    ``groups`` holds, per synonym group, the matches of its terms in the
+    distinct texts as ``(text ids, match starts, matched terms)``.
+    """
+
+    def __init__(self, codes, uniques, groups=None):
+        self.codes = codes
+        self.uniques = uniques
+        self.groups = groups if groups is not None else {}
+
+    @classmethod
+    def from_frame(cls, df, index_groups=False):
+        n = len(df)
+        parts = [df[c].astype(str).tolist() if c in df.columns else [""] * n for c in ALLERGY_TEXT_COLS]
+        codes, uniques = pd.factorize(np.asarray([" ".join(p) for p in zip(*parts)], dtype=object))
+        text = cls(codes, np.asarray([normalize_token(u) for u in uniques], dtype=object))
+        if index_groups:
+            text.groups = {g: text._scan(group_terms(g)) for g in ALLERGY_SYNONYMS}
+        return text
+
+    def __len__(self):
+        return len(self.codes)
+
+    def take(self, rows):
+        """The texts of the given row positions (e.g. a filtered slice of the catalog)."""
+        return AllergyText(self.codes[np.asarray(rows)], self.uniques, self.groups)
+
+    def _scan(self, terms):
+        # 긴 용어를 먼저 두면 같은 위치에서는 가장 긴 용어가 잡힌다 (leftmost-longest)
+        search = re.compile("|".join(map(re.escape, sorted(terms, key=len, reverse=True)))).search
+        ids, starts, found = [], [], []
+        for k, text in enumerate(self.uniques):
+            m = search(text)
+            if m is not None:
+                ids.append(k)
+                starts.append(m.start())
+                found.append(m.group(0))
+        return np.asarray(ids, dtype=np.intp), np.asarray(starts, dtype=np.intp), np.asarray(found, dtype=object)
+
+    def group_mask(self, group):
+        """Rows whose text contains one of the group's terms."""
+        ids = self.groups[group][0] if group in self.groups else self._scan(group_terms(group))[0]
+        hit = np.zeros(len(self.uniques) + 1, dtype=bool)
+        hit[ids] = True
+        return hit[self.codes]
+
+    def match(self, terms=(), groups=()):
+        """First allergy term found in each row's text (leftmost, longest), or ``None``.
+
+        ``groups`` are resolved through the precomputed group matches;
+        ``terms`` are searched in the distinct texts.
+        """
+        tables = [self.groups[g] if g in self.groups else self._scan(group_terms(g)) for g in groups]
+        terms = {normalize_token(t) for t in terms} - {""}
+        if terms:
+            tables.append(self._scan(terms))
+        best_start = np.full(len(self.uniques) + 1, np.iinfo(np.intp).max)
+        best_len = np.zeros(len(self.uniques) + 1, dtype=np.intp)
+        found = np.full(len(self.uniques) + 1, None, dtype=object)
+        for ids, starts, hits in tables:
+            lens = np.fromiter(map(len, hits), dtype=np.intp, count=len(hits))
+            better = (starts < best_start[ids]) | ((starts == best_start[ids]) & (lens > best_len[ids]))
+            ids = ids[better]
+            best_start[ids] = starts[better]
+            best_len[ids] = lens[better]
+            found[ids] = hits[better]
+        return found[self.codes]
+
+
+_rebuild()
+_user_file = os.environ.get(SYNONYMS_ENV) or (SYNONYMS_FILE if os.path.exists(SYNONYMS_FILE) else None)
+if _user_file:
+    load_synonyms(_user_file)
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""HTTP API for the recommendations (ASGI).
+
+    GAMJA_CATALOG=catalog.csv uvicorn gamja.api:app --port 8000
+    python -m gamja.api --catalog catalog.csv --port 8000
+
+Endpoints (JSON in, JSON out):
+
+``GET|POST /recommend``
+    A profile with the form keys of :mod:`gamja.profile` plus the page
+    options ``price_min``/``price_max``, ``grain_free``, ``vet_diet``,
+    ``sort_key``, ``favorites``/``dislikes`` (item ids), ``limit`` (or
+    ``food_limit``/``treat_limit``) and ``offset``.  POST takes a JSON object; GET takes query parameters, with
+    list fields repeated or comma separated.  Returns the food and treat
+    picks with score, reasons and grams/day or pieces/day.
+``GET /products/{sku}``
+    One catalog row.
+``GET /facets``
+    Facet values and flag counts of the catalog, numeric bounds, sort keys.
+
+``app`` is a plain ASGI callable, so any ASGI server can run it (uvicorn is
+the one ``main`` starts; it is not required otherwise).  The catalog is
+loaded once per process, at startup, into one :class:`CatalogIndex` that
+every request reads; the answers are those of
+:class:`gamja.service.RecommendService`, with a process-wide cache of base
+rankings, and only the rows of the requested page are materialised.
+"""
+import argparse
+import json
+import os
+from urllib.parse import parse_qs
+
+from .catalog import load_catalog
+from .index import CatalogIndex
+from .service import BOOL_FIELDS, LIST_FIELDS, RecommendService, RequestError, parse_bool, parse_list
+
+CATALOG_ENV = "GAMJA_CATALOG"
+DEFAULT_CATALOG = "catalog.csv"
+MAX_BODY = 1 << 20
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def query_params(query_string):
+    """GET parameters as the JSON object POST would send."""
+    params = {}
+    for key, values in parse_qs(query_string, keep_blank_values=True).items():
+        if key in LIST_FIELDS:
+            params[key] = parse_list(values, key)
+        elif key in BOOL_FIELDS:
+            params[key] = parse_bool(values[-1])
+        else:
+            params[key] = values[-1]
+    return params
+
+
+class App:
+    """ASGI application serving a :class:`RecommendService`.
+
+    The catalog (``catalog_path``, else ``$GAMJA_CATALOG``, else
+    ``catalog.csv``) is loaded at lifespan startup, or by the first request
+    under servers without lifespan support.
+    """
+
+    def __init__(self, catalog_path=None, index=None):
+        self.catalog_path = catalog_path
+        self.service = RecommendService(index) if index is not None else None
+
+    def load(self):
+        if self.service is None:
+            path = self.catalog_path or os.environ.get(CATALOG_ENV) or DEFAULT_CATALOG
+            self.service = RecommendService(CatalogIndex(load_catalog(path)))
+        return self.service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    self.load()
+                except Exception as exc:
+                    await send({"type": "lifespan.startup.failed", "message": str(exc)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _body(self, receive):
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            if size > MAX_BODY:
+                raise HTTPError(413, "request body too large")
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    async def _http(self, scope, receive, send):
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+        try:
+            service = self.load()
+            if path == "/recommend":
+                if method == "POST":
+                    body = await self._body(receive)
+                    if body is None:
+                        return
+                    try:
+                        params = json.loads(body or b"{}")
+                    except ValueError:
+                        raise HTTPError(400, "body is not valid JSON") from None
+                    if not isinstance(params, dict):
+                        raise HTTPError(400, "body must be a JSON object")
+                elif method == "GET":
+                    params = query_params(scope.get("query_string", b"").decode("utf-8"))
+                else:
+                    raise HTTPError(405, "use GET or POST")
+                status, payload = 200, service.recommend(params)
+            elif path == "/facets" or path.startswith("/products/"):
+                if method != "GET":
+                    raise HTTPError(405, "use GET")
+                payload = service.facets() if path == "/facets" else service.product(path[len("/products/"):])
+                status = 200
+            else:
+                raise HTTPError(404, f"not found: {path}")
+        except (HTTPError, RequestError) as exc:
+            status, payload = exc.status, {"error": exc.message}
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json; charset=utf-8"),
+                                (b"content-length", str(len(body)).encode("ascii"))]})
+        await send({"type": "http.response.body", "body": body})
+
+
+app = App()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the recommendation API.")
+    parser.add_argument("--catalog", default=None, help=f"catalog CSV (default: ${CATALOG_ENV} or {DEFAULT_CATALOG})")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("serving needs an ASGI server: pip install uvicorn") from None
+    uvicorn.run(App(args.catalog), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Static assets of the apps: downscaled images, the global CSS, the web font and icons.
+
+The logo (cheese_cat_logo.png, 1024 × 1024, 1.3 MB) is shown at under
+120 CSS px, yet the apps used to inline the whole file as a base64 data URI
+on every step-1 run.  :func:`image_variants` writes small PNG and WebP
+copies (``LOGO_SIZES``: 1x and 2x screens) into a directory the app serves
+statically (Streamlit's ``static/`` folder with ``server.enableStaticServing``)
+and reuses them as long as the source is unchanged: a JSON stamp beside them
+holds the source size/mtime and SHA-256, like the catalog cache.  The digest
+goes into the URLs as ``?v=``, for which the static file server sends
+long-lived cache headers, so browsers fetch each variant once per logo
+version.  :func:`logo_html` builds the ``<picture>`` for them and
+:func:`static_url` the URL of any other file under the static folder; the
+apps share both.
+
+Streamlit's ``app/static`` handler only labels images (``STATIC_IMAGE_SUFFIXES``)
+with their own type; everything else goes out as ``text/plain`` with
+``nosniff``, which browsers refuse as CSS or SVG, so such files are inlined
+as ``data:`` URIs instead.
+
+The apps' global CSS cannot take that route, so :func:`style_tag` inlines
+it; Streamlit sends a repeated element of at least
+``global.minCachedMessageSize`` bytes (lowered in ``.streamlit/config.toml``)
+as a hash reference on later runs of the same session, so the CSS travels
+once per session rather than on every rerun.
+
+The fallback logo is bundled (``static/icons/cat.svg``) so the hero does
+not depend on a placeholder host.  The 'Gowun Dodum' web font is not: no
+subset of it is shipped, so :func:`font_css` imports it from Google Fonts,
+unless ``GAMJA_OFFLINE`` is set (see the README), in which case the apps
+stay on their local font stack and never reference another host.
+
+Pillow is optional (streamlit installs it); without it :func:`image_variants`
+returns ``None`` and callers keep the original file.
+"""
+import base64
+import hashlib
+import json
+import os
+from pathlib import Path
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+OFFLINE_ENV = "GAMJA_OFFLINE"
+GOOGLE_FONTS_URL = "https://fonts.googleapis.com/css2?family=Gowun+Dodum&display=swap"
+LOGO_SIZES = (96, 192)
+IMAGE_FORMATS = ("webp", "png")
+STATIC_IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+STAMP_NAME = "variants.json"
+_MIME = {".png": "image/png", ".apng": "image/png", ".webp": "image/webp", ".gif": "image/gif",
+         ".svg": "image/svg+xml"}
+
+
+def offline():
+    """Whether ``$GAMJA_OFFLINE`` asks for no external fetches at all."""
+    return os.environ.get(OFFLINE_ENV, "").strip().lower() in ("1", "true", "y", "yes")
+
+
+def font_css():
+    """CSS that provides the 'Gowun Dodum' family: the Google Fonts import, or nothing offline."""
+    if offline():
+        return ""
+    return f"@import url('{GOOGLE_FONTS_URL}');\n"
+
+
+def data_uri(path):
+    """``data:`` URI of a file, for when it cannot be served statically."""
+    path = Path(path)
+    mime = _MIME.get(path.suffix.lower(), "image/jpeg")
+    return f"data:{mime};base64,{base64.b64encode(path.read_bytes()).decode('ascii')}"
+
+
+def static_url(static_dir, rel, serving=True):
+    """URL of ``static_dir/rel`` (``rel`` may end in ``#fragment``) for pages of the app.
+
+    ``app/static/<rel>?v=<hash>`` when ``static_dir`` is the app's static
+    folder, ``serving`` (``server.enableStaticServing``) is on and the file is
+    an image the handler serves as such; a ``data:`` URI otherwise.
+    """
+    rel, hash_, fragment = rel.partition("#")
+    path = Path(static_dir) / rel
+    if serving and path.suffix.lower() in STATIC_IMAGE_SUFFIXES:
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        return f"app/static/{Path(rel).as_posix()}?v={digest[:12]}{hash_}{fragment}"
+    return f"{data_uri(path)}{hash_}{fragment}"
+
+
+def _save(image, path, fmt):
+    tmp = path.with_name(path.name + ".tmp")
+    if fmt == "webp":
+        image.save(tmp, "WEBP", quality=85, method=6)
+    else:
+        image.save(tmp, "PNG", optimize=True)
+    os.replace(tmp, path)
+
+
+def image_variants(source, out_dir, sizes=LOGO_SIZES, formats=IMAGE_FORMATS):
+    """``(sha256, {(size, fmt): path})`` of copies of ``source`` at most ``size`` px wide and high.
+
+    Files are named ``<stem>-<size>.<fmt>`` in ``out_dir`` and only written
+    when missing or when ``source`` changed.  Returns ``None`` without
+    Pillow; ``OSError`` (e.g. a read-only ``out_dir``) propagates.
+    """
+    if Image is None:
+        return None
+    source, out_dir = Path(source), Path(out_dir)
+    stat = source.stat()
+    files = {(size, fmt): out_dir / f"{source.stem}-{size}.{fmt}" for size in sizes for fmt in formats}
+    stamp_path = out_dir / f"{source.stem}-{STAMP_NAME}"
+    try:
+        stamp = json.loads(stamp_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        stamp = {}
+    names = sorted(p.name for p in files.values())
+    fresh = stamp.get("files") == names and all(p.exists() for p in files.values())
+    if fresh and (stamp.get("size"), stamp.get("mtime_ns")) == (stat.st_size, stat.st_mtime_ns):
+        return stamp["sha256"], files
+
+    digest = hashlib.sha256(source.read_bytes()).hexdigest()
+    if not (fresh and digest == stamp.get("sha256")):
+        out_dir.mkdir(parents=True, exist_ok=True)
+        with Image.open(source) as im:
+            im = im.convert("RGBA" if "A" in im.getbands() or "transparency" in im.info else "RGB")
+            for size in sizes:
+                small = im.copy()
+                small.thumbnail((size, size), Image.LANCZOS)
+                for fmt in formats:
+                    _save(small, files[size, fmt], fmt)
+    tmp = stamp_path.with_name(stamp_path.name + ".tmp")
+    tmp.write_text(json.dumps({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest,
+                               "files": names}), encoding="utf-8")
+    os.replace(tmp, stamp_path)
+    return digest, files
+
+
+def logo_html(sources, static_dir, serving=True, css_class="brand-logo", alt="logo"):
+    """``<picture>`` markup for the first existing file of ``sources``, or ``None``.
+
+    The variants of :func:`image_variants` go to ``static_dir/logo`` and are
+    linked through ``app/static`` (1x and 2x, WebP first); without
+    ``serving`` the small PNG is inlined, and without Pillow (or when
+    ``static_dir`` is read-only) the original file is.
+    """
+    for source in map(Path, sources):
+        if not source.exists():
+            continue
+        try:
+            variants = image_variants(source, Path(static_dir) / "logo")
+        except OSError:
+            variants = None
+        if variants is None:
+            return f'<img class="{css_class}" src="{data_uri(source)}" alt="{alt}"/>'
+        digest, files = variants
+        small, large = LOGO_SIZES
+        if not serving:
+            return f'<img class="{css_class}" src="{data_uri(files[small, "png"])}" alt="{alt}"/>'
+        url = {key: f"app/static/logo/{path.name}?v={digest[:12]}" for key, path in files.items()}
+        return (f'<picture><source type="image/webp" srcset="{url[small, "webp"]} 1x, {url[large, "webp"]} 2x"/>'
+                f'<img class="{css_class}" src="{url[small, "png"]}" '
+                f'srcset="{url[small, "png"]} 1x, {url[large, "png"]} 2x" alt="{alt}"/></picture>')
+    return None
+
+
+def style_tag(css):
+    """``<style>`` element carrying ``css`` for ``st.markdown(..., unsafe_allow_html=True)``."""
+    return f"<style>\n{css}\n</style>"
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Recommendations for a file of cat profiles (offline batch).
+
+    python -m gamja.batch profiles.csv -o picks.jsonl --top 5 --workers 4
+    python -m gamja.batch profiles.jsonl -o picks.csv --catalog catalog.csv
+
+Input is CSV (one profile per row) or JSON Lines (one object per line), by
+file suffix; ``-`` reads JSON Lines from stdin.  The keys are those of a
+``/recommend`` request (:mod:`gamja.service`): ``age``, ``weight``,
+``neutered``, ``activity``, ``conditions``, ``base_allergy``,
+``custom_allergy``, ``sel_brands`` … plus ``id``.  In CSV, list columns are
+separated with ``;`` (or ``,``), empty cells take the form defaults, and an
+``allergies`` column is read as free-text allergies (``custom_allergy``).
+
+Output is JSON Lines (one record per profile: stage, daily kcal, treat
+budget and the top food/treat picks with grams/day or pieces/day) or, for a
+``.csv`` output, one row per pick.  A profile that cannot be ranked gives a
+record with ``error`` instead of failing the run.
+
+Profiles are read, ranked and written as a stream in input order, a chunk at
+a time; the profiles of a chunk are scored together as one matrix
+(:meth:`~gamja.service.RecommendService.recommend_many`).  With
+``--workers`` above 1 the chunks are ranked in a process pool whose workers
+each load the catalog once, at start-up; at most two chunks per worker are
+in flight, so memory stays flat however long the input is.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from collections import deque
+
+from .service import LIST_FIELDS, RequestError
+
+DEFAULT_TOP = 5
+DEFAULT_CHUNK = 64
+CSV_FIELDS = ("profile_id", "stage", "daily_kcal", "kind", "rank", "id", "sku", "brand", "name", "score",
+              "grams_per_day", "pieces_per_day", "reasons", "error")
+
+_service = None  # 워커 프로세스마다 하나 (_init_worker 가 만든다)
+
+
+def _init_worker(catalog_path):
+    global _service
+    from .catalog import load_catalog
+    from .index import CatalogIndex
+    from .service import RecommendService
+
+    _service = RecommendService(CatalogIndex(load_catalog(catalog_path)))
+
+
+def _csv_profile(row):
+    profile = {}
+    for key, value in row.items():
+        if key is None or value is None or not value.strip():
+            continue
+        key, value = key.strip(), value.strip()
+        if key == "allergies":
+            key = "custom_allergy"
+            value = value.replace(";", ",")
+        elif key in LIST_FIELDS:
+            value = [t.strip() for t in value.replace(";", ",").split(",") if t.strip()]
+        profile[key] = value
+    return profile
+
+
+def read_profiles(path):
+    """Profiles of a CSV or JSON Lines file (``-`` for JSONL on stdin), one at a time."""
+    if path == "-":
+        lines = sys.stdin
+    elif path.lower().endswith(".csv"):
+        with open(path, encoding="utf-8-sig", newline="") as fh:
+            for row in csv.DictReader(fh):
+                yield _csv_profile(row)
+        return
+    else:
+        lines = open(path, encoding="utf-8-sig")
+    try:
+        for n, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                profile = json.loads(line)
+            except ValueError:
+                profile = {"_error": f"line {n}: not valid JSON"}
+            yield profile if isinstance(profile, dict) else {"_error": f"line {n}: not a JSON object"}
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
+
+def _record(n, profile, answer):
+    pid = profile.get("id", profile.get("profile_id", n))
+    if isinstance(answer, RequestError):
+        return {"id": pid, "error": answer.message}
+    return {"id": pid, "stage": answer["stage"], "daily_kcal": answer["daily_kcal"],
+            "treat_budget_kcal": answer["treat_budget_kcal"],
+            "food": answer["food"]["items"], "treat": answer["treat"]["items"]}
+
+
+def _run_chunk(chunk, top_food, top_treat, service=None):
+    # 한 청크의 프로필은 recommend_many 로 한꺼번에 (점수순이면 행렬 한 번으로) 순위를 매긴다
+    service = service or _service
+    valid = [(n, p) for n, p in chunk if "_error" not in p]
+    answers = iter(service.recommend_many([dict(p, food_limit=top_food, treat_limit=top_treat, offset=0)
+                                           for _, p in valid]))
+    return [_record(n, p, RequestError(p["_error"]) if "_error" in p else next(answers)) for n, p in chunk]
+
+
+def _chunks(profiles, size):
+    chunk = []
+    for n, profile in enumerate(profiles, 1):
+        chunk.append((n, profile))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def recommend_profiles(profiles, catalog_path, top_food=DEFAULT_TOP, top_treat=DEFAULT_TOP, workers=1,
+                       chunk_size=DEFAULT_CHUNK):
+    """Records for ``profiles`` (an iterable of dicts), yielded lazily in input order."""
+    if workers <= 1:
+        from .catalog import load_catalog
+        from .index import CatalogIndex
+        from .service import RecommendService
+
+        service = RecommendService(CatalogIndex(load_catalog(catalog_path)))
+        for chunk in _chunks(profiles, chunk_size):
+            yield from _run_chunk(chunk, top_food, top_treat, service)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(catalog_path,)) as pool:
+        pending = deque()
+        for chunk in _chunks(profiles, chunk_size):
+            pending.append(pool.submit(_run_chunk, chunk, top_food, top_treat))
+            while len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _write_jsonl(records, out):
+    n = 0
+    for record in records:
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        n += 1
+    return n
+
+
+def _write_csv(records, out):
+    writer = csv.DictWriter(out, CSV_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    n = 0
+    for record in records:
+        n += 1
+        base = {"profile_id": record["id"], "stage": record.get("stage"), "daily_kcal": record.get("daily_kcal")}
+        if "error" in record:
+            writer.writerow({**base, "error": record["error"]})
+            continue
+        for kind in ("food", "treat"):
+            for rank, item in enumerate(record[kind], 1):
+                writer.writerow({**base, **item, "kind": kind, "rank": rank, "reasons": " / ".join(item["reasons"])})
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Top food and treat picks for a file of cat profiles.")
+    parser.add_argument("profiles", help="CSV or JSON Lines file of profiles ('-' for JSON Lines on stdin)")
+    parser.add_argument("-o", "--output", default="-", help="output .jsonl or .csv (default: JSON Lines on stdout)")
+    parser.add_argument("--catalog", default=os.environ.get("GAMJA_CATALOG") or "catalog.csv")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="picks per kind (default %(default)s)")
+    parser.add_argument("--top-food", type=int, default=None)
+    parser.add_argument("--top-treat", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU count; 1 runs in this process)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK, help="profiles per task")
+    args = parser.parse_args(argv)
+
+    top_food = args.top if args.top_food is None else args.top_food
+    top_treat = args.top if args.top_treat is None else args.top_treat
+    records = recommend_profiles(read_profiles(args.profiles), args.catalog, top_food, top_treat,
+                                 workers=args.workers, chunk_size=max(1, args.chunk_size))
+    as_csv = args.output.lower().endswith(".csv")
+    if args.output == "-":
+        out = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", newline="" if as_csv else None)
+    else:
+        out = open(args.output, "w", encoding="utf-8-sig" if as_csv else "utf-8", newline="" if as_csv else None)
+    with out:
+        n = (_write_csv if as_csv else _write_jsonl)(records, out)
+    print(f"{n} profiles", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
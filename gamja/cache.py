@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""A small bounded LRU cache with expiry and hit/miss counters.
+
+Used to memoise ranked recommendation results by query fingerprint
+(:func:`gamja.recommend.query_fingerprint`), so reruns that do not change
+the query (pagination, view switches) skip filtering and scoring.  The same
+class backs the process-wide cache of base rankings shared by all sessions,
+which is additionally capped by memory.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Least-recently-used mapping with at most ``maxsize`` entries.
+
+    With ``max_bytes``, the least recently used entries are also evicted
+    while the summed ``sizeof(value)`` (default: ``value.nbytes``) exceeds it.
+    Entries older than ``ttl`` seconds (if given) count as misses and are
+    dropped when looked up.  Safe to share between threads.
+    """
+
+    def __init__(self, maxsize=32, ttl=None, max_bytes=None, sizeof=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: getattr(value, "nbytes", 0))
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data and not self._expired(self._data[key][0])
+
+    def _expired(self, stamp):
+        return self.ttl is not None and self.clock() - stamp > self.ttl
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or self._expired(entry[0]):
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _drop(self, key):
+        self.nbytes -= self._data.pop(key)[2]
+        self.evictions += 1
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= self._data.pop(key)[2]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return  # 한 항목이 한도보다 크면 저장하지 않는다
+            self._data[key] = (self.clock(), value, size)
+            self.nbytes += size
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self.nbytes > self.max_bytes):
+                self._drop(next(iter(self._data)))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self._data), "maxsize": self.maxsize, "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes}
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Result cards of the apps: the HTML of one card and the grid with its buttons.
+
+:func:`card_html` turns one ranked row (``with_reasons(...).to_dict("records")``)
+into a single HTML string: title, meta line, score, serving note, tags,
+reasons and shop link.  Markdown HTML blocks end at a blank line, so the
+parts are joined without newlines and bold text is written as tags; every
+catalog field is escaped.  The apps differ only in a few details, which
+are keyword options here (v5 is the default, v6 passes ``price=True``,
+``pouch_title=True``, ``reasons="details"`` and ``link=SHOP_BUTTON``).
+
+:func:`card_grid` lays the cards out three to a row with each card's
+favorite / dislike / hide buttons in the same column, right under it, so
+they stay with their card when Streamlit stacks the columns on narrow
+screens.  It takes the ``streamlit`` module as an argument to keep this
+package headless.  The button callbacks (:func:`toggle_favorite`,
+:func:`toggle_dislike`, :func:`hide`) only change ``state`` (the session
+state), so a click reruns nothing but the fragment around the grid.
+"""
+import html
+
+import pandas as pd
+
+from .nutrition import grams_per_day, pieces_per_day, treat_budget
+
+SHOP_LINK = ("<a class='shop-link' href=\"{url}\" target='_blank' rel='noopener noreferrer'>상품 보기</a>")
+SHOP_BUTTON = ('<a href="{url}" target="_blank" rel="noopener noreferrer" style="display:inline-block; '
+               'text-decoration:none; background:#FFF5EE; border:1px solid #F2CDAE; padding:8px 14px; '
+               'border-radius:22px; color:#5f3b23; font-weight:700; font-size:0.9rem;">🛒 상품 보기</a>')
+
+
+def _esc(value):
+    return html.escape(str(value))
+
+
+def card_html(row, daily_kcal, is_treat=False, *, price=False, pouch_title=False,
+              feed_label="권장 1일 급여량(사료)", reasons="inline", link=SHOP_LINK):
+    """One card as ``<div class='card-cell'>…</div>``.
+
+    ``price`` adds the price to the score line, ``pouch_title`` breaks
+    "습식/파우치" in the title over two lines, ``reasons`` is ``"inline"``
+    (one muted line) or ``"details"`` (pills in a collapsed ``<details>``)
+    and ``link`` is the shop link template, formatted with ``url``.
+    """
+    display_name = _esc(row.get('name', '(이름 없음)'))
+    if pouch_title and '습식/파우치' in display_name:
+        display_name = display_name.replace('습식/파우치', "습식<br/><span class='title-sub'>파우치</span>")
+    score_line = (f"점수: <strong>{round(float(row.get('score', 0)), 2)}</strong>"
+                  f" · 가격대: <strong>{_esc(row.get('price_tier', ''))}</strong>")
+    if price:
+        price_val = row.get('price_krw')
+        score_line += f" · 가격: {f'{int(price_val):,}원' if pd.notna(price_val) else '정보없음'}"
+    parts = [f"<h3>{display_name}</h3>",
+             f"<div class='meta'>브랜드: {_esc(row.get('brand', ''))} · 형태: {_esc(row.get('texture', ''))}"
+             f" · 단백질: {_esc(row.get('protein', ''))}</div>",
+             f"<p>{score_line}</p>"]
+
+    grams = grams_per_day(daily_kcal, row.get("kcal_per_100g"))
+    if not is_treat and grams is not None:
+        parts.append(f"<div class='note ok'>{feed_label}: <strong>약 {grams} g/일</strong></div>")
+    if is_treat:
+        budget = treat_budget(daily_kcal)
+        per_piece = row.get("treat_kcal_per_piece")
+        count = pieces_per_day(daily_kcal, per_piece)
+        if count is not None:
+            parts.append(f"<div class='note info'>간식 한도 ≈ {budget} kcal → <strong>하루 {count}개</strong>"
+                         f" (1개당 {int(per_piece)} kcal)</div>")
+        else:
+            parts.append(f"<div class='note info'>간식 한도 ≈ {budget} kcal · (CSV에 treat_kcal_per_piece를 넣으면 개수 계산)</div>")
+
+    tags = [t for t in str(row.get("tags", "")).split(";") if t]
+    if tags:
+        parts.append("<div>" + "".join([f"<span class='pill tag'>{_esc(t)}</span>" for t in tags]) + "</div>")
+
+    row_reasons = row.get("reasons") or []
+    if row_reasons and reasons == "details":
+        parts.append("<details><summary>추천 이유 보기</summary><div>"
+                     + "".join([f"<span class='pill reason'>{_esc(r)}</span>" for r in row_reasons]) + "</div></details>")
+    elif row_reasons:
+        parts.append("<div class='small muted'>추천 이유: " + _esc(", ".join(row_reasons)) + "</div>")
+
+    product_url = row.get("product_url", "")
+    if isinstance(product_url, str) and product_url.startswith("http"):
+        parts.append(link.format(url=html.escape(product_url)))
+    return "<div class='card-cell'>" + "".join(parts) + "</div>"
+
+
+def toggle_favorite(state, item_id):
+    """Add ``item_id`` to ``state["favorites"]``, or remove it if already there."""
+    if item_id in state["favorites"]:
+        state["favorites"].remove(item_id)
+    else:
+        state["favorites"].add(item_id)
+
+
+def toggle_dislike(state, item_id):
+    """Add ``item_id`` to ``state["dislikes"]`` (dropping it from the favorites), or remove it."""
+    if item_id in state["dislikes"]:
+        state["dislikes"].remove(item_id)
+    else:
+        state["dislikes"].add(item_id)
+        state["favorites"].discard(item_id)
+
+
+def hide(state, item_id):
+    """Move ``item_id`` to the dislikes for good."""
+    state["dislikes"].add(item_id)
+    state["favorites"].discard(item_id)
+
+
+def card_grid(st, cards, ids, state, key_prefix, show_actions=True, per_row=3):
+    """Render ``cards`` (HTML) with the buttons of ``ids``, ``per_row`` cards to a row.
+
+    The same item can show up in several tabs (recommendations, favorites),
+    so button keys carry ``key_prefix``.
+    """
+    for lo in range(0, len(cards), per_row):
+        for col, card, item_id in zip(st.columns(per_row), cards[lo:lo + per_row], ids[lo:lo + per_row]):
+            with col:
+                st.markdown(card, unsafe_allow_html=True)
+                if not show_actions:
+                    continue
+                c1, c2, c3 = st.columns(3)
+                with c1:
+                    st.button(("★ 즐겨찾기 해제" if item_id in state["favorites"] else "⭐ 즐겨찾기"),
+                              key=f"fav_{key_prefix}_{item_id}", on_click=toggle_favorite, args=(state, item_id))
+                with c2:
+                    st.button(("비선호 해제" if item_id in state["dislikes"] else "🚫 비선호"),
+                              key=f"dis_{key_prefix}_{item_id}", on_click=toggle_dislike, args=(state, item_id))
+                with c3:
+                    st.button("🧹 숨기기", key=f"hide_{key_prefix}_{item_id}", on_click=hide, args=(state, item_id))
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""Catalog loading with a typed schema and a persistent columnar cache.
+
+Parsing catalog.csv (read_csv + string/number/boolean normalisation) is the
+slowest part of a cold start.  After the first load the normalised frame is
+written next to the CSV as an Arrow IPC (Feather) file and reused as long as
+the source file is unchanged: the size/mtime pair is checked first, and only
+when that differs is the content hash compared before re-parsing.
+
+Columns are stored in the compact dtypes declared in ``CATALOG_SCHEMA`` so
+the cached frame, and every per-session slice of it, stays small.
+
+Frames loaded from a path carry the SHA-256 of the source file in
+``df.attrs["source_sha256"]``; it identifies the catalog version.
+
+pyarrow is optional; without it the CSV is simply parsed every time.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # streamlit 이 pyarrow 를 함께 설치하지만 코어는 없이도 동작
+    pa = None
+
+TEXT_COLS = ["brand", "name", "type", "texture", "protein", "ingredients", "price_tier", "tags", "category",
+             "country", "product_url", "image_url", "availability_region", "sku"]
+NUM_COLS = ["moisture_pct", "kcal_per_100g", "magnesium_mg_per_100kcal", "phosphorus_pct_dm", "sodium_pct_dm",
+            "crude_protein_pct_dm", "crude_fat_pct_dm", "crude_fiber_pct_dm", "ash_pct_dm", "omega3_pct_dm",
+            "calcium_pct_dm", "package_size_g", "price_krw", "palatability_score", "rating_count",
+            "treat_kcal_per_piece"]
+BOOL_COLS = ["grain_free", "single_protein", "veterinary_diet", "indoor_suitable", "neutered_suitable"]
+
+# 저장 dtype. 숫자 컬럼은 결측 없이 모두 정수이면 들어맞는 가장 작은 정수형으로,
+# 아니면 여기 적힌 실수형으로 저장한다. 자유 텍스트(name, ingredients, URL, sku)는 object 유지.
+CATALOG_SCHEMA = {
+    "brand": "category", "type": "category", "texture": "category", "protein": "category",
+    "price_tier": "category", "tags": "category", "category": "category", "country": "category",
+    "availability_region": "category",
+    "moisture_pct": "float32", "kcal_per_100g": "float32", "magnesium_mg_per_100kcal": "float32",
+    "phosphorus_pct_dm": "float32", "sodium_pct_dm": "float32", "crude_protein_pct_dm": "float32",
+    "crude_fat_pct_dm": "float32", "crude_fiber_pct_dm": "float32", "ash_pct_dm": "float32",
+    "omega3_pct_dm": "float32", "calcium_pct_dm": "float32", "treat_kcal_per_piece": "float32",
+    "package_size_g": "float32", "palatability_score": "float32", "rating_count": "float32",
+    # 금액은 원 단위 그대로 비교/표시하므로 정밀도를 줄이지 않는다
+    "price_krw": "float64",
+    "grain_free": "bool", "single_protein": "bool", "veterinary_diet": "bool",
+    "indoor_suitable": "bool", "neutered_suitable": "bool",
+}
+
+CACHE_DIR_NAME = ".catalog_cache"
+# 정규화 규칙이 바뀌면 올려서 기존 캐시를 무효화
+CACHE_FORMAT_VERSION = 2
+
+
+def normalize_catalog(df):
+    """Coerce the raw CSV columns to the types the apps expect."""
+    for c in TEXT_COLS:
+        if c in df.columns:
+            df[c] = df[c].astype(str).fillna("")
+    for c in NUM_COLS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+    for c in BOOL_COLS:
+        if c in df.columns:
+            df[c] = df[c].astype(str).str.lower().isin(["true", "1", "y", "yes"])
+    return df
+
+
+def _compact_number(s, float_dtype):
+    values = s.to_numpy()
+    if len(values) and not s.isna().any() and (values == values.round()).all():
+        return pd.to_numeric(s, downcast="integer")
+    return s.astype(float_dtype)
+
+
+def apply_schema(df):
+    """Convert a normalised catalog to the dtypes of ``CATALOG_SCHEMA``."""
+    for col, dtype in CATALOG_SCHEMA.items():
+        if col not in df.columns:
+            continue
+        if dtype.startswith("float"):
+            df[col] = _compact_number(df[col], dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cache_paths(path, cache_dir):
+    path = Path(path).resolve()
+    cache_dir = Path(cache_dir) if cache_dir else path.parent / CACHE_DIR_NAME
+    stem = f"{path.stem}-{hashlib.md5(str(path).encode('utf-8')).hexdigest()[:8]}"
+    return cache_dir / f"{stem}.feather", cache_dir / f"{stem}.json"
+
+
+def _read_cache(data_path, meta_path, source, stat):
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None, None
+    if meta.get("version") != CACHE_FORMAT_VERSION or not data_path.exists():
+        return None, None
+    digest = meta.get("sha256")
+    if (meta.get("size"), meta.get("mtime_ns")) != (stat.st_size, stat.st_mtime_ns):
+        # mtime 만 바뀐 경우(체크아웃, 복사 등)는 내용 해시로 다시 확인
+        digest = _file_sha256(source)
+        if digest != meta.get("sha256"):
+            return None, digest
+        meta.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        try:
+            _write_json(meta_path, meta)
+        except OSError:
+            pass
+    try:
+        table = feather.read_table(str(data_path), memory_map=True)
+    except (OSError, pa.ArrowException):
+        return None, digest
+    return table.to_pandas(), digest
+
+
+def _write_json(path, obj):
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(obj), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _write_cache(df, data_path, meta_path, stat, digest):
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = data_path.with_suffix(".feather.tmp")
+    feather.write_feather(df, str(tmp), compression="uncompressed")
+    os.replace(tmp, data_path)
+    _write_json(meta_path, {"version": CACHE_FORMAT_VERSION, "size": stat.st_size,
+                            "mtime_ns": stat.st_mtime_ns, "sha256": digest})
+
+
+def load_catalog(path, cache_dir=None, use_cache=True):
+    """Load and normalise a catalog CSV (a path or an uploaded file object).
+
+    Paths are served from the columnar cache when possible; file-like
+    objects are always parsed.
+    """
+    if not isinstance(path, (str, os.PathLike)):
+        return apply_schema(normalize_catalog(pd.read_csv(path)))
+    if not use_cache or pa is None:
+        df = apply_schema(normalize_catalog(pd.read_csv(path)))
+        df.attrs["source_sha256"] = _file_sha256(path)
+        return df
+
+    stat = os.stat(path)
+    data_path, meta_path = _cache_paths(path, cache_dir)
+    df, digest = _read_cache(data_path, meta_path, path, stat)
+    if df is not None:
+        df.attrs["source_sha256"] = digest
+        return df
+
+    df = apply_schema(normalize_catalog(pd.read_csv(path)))
+    digest = digest or _file_sha256(path)
+    df.attrs["source_sha256"] = digest
+    try:
+        _write_cache(df, data_path, meta_path, stat, digest)
+    except OSError:
+        pass  # 읽기 전용 배포 환경 등: 캐시 없이 계속
+    return df
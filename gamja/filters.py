@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Catalog filtering without per-rerun copies.
+
+All predicates of the results page are resolved against the precomputed
+bitmaps and range indexes of a :class:`~gamja.index.CatalogIndex` and
+combined with bitwise AND/OR; only the surviving rows of the shared catalog
+are materialised.
+"""
+import numpy as np
+
+
+def selected_or_all(selected, all_values, all_label="전체"):
+    """A facet selection from the form: nothing or ``all_label`` selected means every value."""
+    if (not selected) or (all_label in selected):
+        return list(all_values)
+    return [x for x in selected if x != all_label]
+
+
+def filter_bitmap(index, *, brands=(), price_tiers=(), textures=(), proteins=(),
+                  price_range=None, grain_free=False, vet_diet=False, ranges=None, exclude_allergens=()):
+    """Packed bitmap of the catalog rows that pass every filter.
+
+    Empty selections leave the facet unfiltered; ``price_range`` treats a
+    missing price as 0 원, as the apps always have.  ``ranges`` maps further
+    indexed numeric columns (``kcal_per_100g``, ``phosphorus_pct_dm``, ...)
+    to inclusive ``(lo, hi)`` bounds, either of which may be ``None``; rows
+    missing that value are excluded.  ``exclude_allergens`` drops the rows of
+    the given ``ALLERGY_SYNONYMS`` groups outright (the apps only penalise
+    them in the score).
+    """
+    bitmap = index.all_rows()
+    for col, selected in (("brand", brands), ("price_tier", price_tiers),
+                          ("texture", textures), ("protein", proteins)):
+        if selected and col in index.facets:
+            bitmap &= index.any_of(col, selected)
+    ranges = dict(ranges or {})
+    if price_range is not None:
+        ranges["price_krw"] = price_range
+    for col, (lo, hi) in ranges.items():
+        if col not in index.ranges:
+            continue
+        in_range = index.in_range(col, lo, hi)
+        if in_range is not None:
+            bitmap &= in_range
+    if grain_free and "grain_free" in index.flags:
+        bitmap &= index.flags["grain_free"]
+    if vet_diet and "veterinary_diet" in index.flags:
+        bitmap &= index.flags["veterinary_diet"]
+    if exclude_allergens:
+        bitmap &= ~index.allergen_rows(exclude_allergens)
+    return bitmap
+
+
+def filter_mask(index, **filters):
+    """Boolean mask form of :func:`filter_bitmap`."""
+    return index.mask(filter_bitmap(index, **filters))
+
+
+def apply_filters(index, **filters):
+    """Rows of the catalog passing every filter, in catalog order."""
+    return index.data.take(np.flatnonzero(filter_mask(index, **filters)))
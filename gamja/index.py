@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""Precomputed indexes over a loaded catalog.
+
+``CatalogIndex`` is built once per catalog and shared read-only by every
+session.  Each facet value (brand, type, price tier, texture, protein) and
+each boolean flag is stored as a packed bitset (``np.packbits``: one bit per
+row), so any filter combination is a handful of bitwise OR/AND operations
+on arrays 1/8 the catalog length instead of ``isin`` scans.
+
+Numeric columns used for range filters get a :class:`RangeIndex`: the
+column sorted once, so ``lo <= x <= hi`` is two binary searches and a slice
+of row positions.
+
+Columns the results can be sorted by get their row order precomputed too
+(both directions, missing values last, ties in catalog order), so a sorted
+filtered result is that permutation with the rows outside the filter
+skipped.
+
+The scoring rules are evaluated once as well: every row's facet values,
+tag and nutrient-threshold hits are kept in a
+:class:`~gamja.scoring.RuleFeatures` table, so scoring a query (or a matrix
+of them, :mod:`gamja.matrix`) only sums the columns its profile switches on.
+
+Allergies are inverted the same way: one bitmap per ``ALLERGY_SYNONYMS``
+group (rows whose text contains any of its terms), so excluding allergen
+groups is a union of precomputed bitmaps.  Free-text allergies are
+substring matches, which :class:`~gamja.allergy.AllergyText` scans per
+distinct text at query time; there is no per-token index for them.
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from .allergy import ALLERGY_SYNONYMS, AllergyText
+from .catalog import CACHE_FORMAT_VERSION
+from .scoring import RuleFeatures, item_ids
+
+FACET_COLS = ("brand", "type", "price_tier", "texture", "protein")
+FLAG_COLS = ("grain_free", "single_protein", "veterinary_diet", "indoor_suitable", "neutered_suitable")
+RANGE_COLS = ("price_krw", "kcal_per_100g", "moisture_pct", "phosphorus_pct_dm", "sodium_pct_dm",
+              "magnesium_mg_per_100kcal", "crude_protein_pct_dm")
+# 정렬 기준으로 쓰는 컬럼: 로드 시 오름차순/내림차순 행 순서를 한 번 만들어 둔다
+SORT_COLS = ("price_krw", "kcal_per_100g")
+# 범위 필터에서 결측을 어떤 값으로 볼지 (가격 슬라이더는 원래부터 결측을 0원으로 취급)
+RANGE_FILL = {"price_krw": 0}
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _codes(values):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), list(values.cat.categories)
+    codes, uniques = pd.factorize(values)
+    return codes, list(uniques)
+
+
+class RangeIndex:
+    """Row positions of one numeric column in ascending value order.
+
+    Missing values are left out, so they never fall inside a range.
+    """
+
+    def __init__(self, values):
+        values = np.asarray(values)
+        order = np.argsort(values, kind="stable")  # NaN 은 맨 뒤로 정렬됨
+        valid = len(values) - int(np.isnan(values).sum()) if values.dtype.kind == "f" else len(values)
+        pos_dtype = np.int32 if len(values) < 2**31 else np.int64
+        self.order = order[:valid].astype(pos_dtype)
+        self.values = values[self.order]
+
+    def _bound(self, x):
+        # float32 컬럼은 임계값도 float32 로 맞춰야 `<=` 비교와 같은 경계가 나온다
+        return self.values.dtype.type(x) if self.values.dtype.kind == "f" else x
+
+    def span(self, lo=None, hi=None):
+        """``(start, stop)`` of the sorted slice with ``lo <= value <= hi``."""
+        start = 0 if lo is None else int(np.searchsorted(self.values, self._bound(lo), "left"))
+        stop = len(self.values) if hi is None else int(np.searchsorted(self.values, self._bound(hi), "right"))
+        return start, max(start, stop)
+
+    def between(self, lo=None, hi=None):
+        """Row positions (in value order) with ``lo <= value <= hi``."""
+        start, stop = self.span(lo, hi)
+        return self.order[start:stop]
+
+    def bounds(self):
+        """``(min, max)`` of the indexed values, or ``None`` for an empty column."""
+        if not len(self.values):
+            return None
+        return self.values[0].item(), self.values[-1].item()
+
+
+class CatalogIndex:
+    """A catalog frame together with its facet/flag bitmaps and numeric range indexes.
+
+    ``data`` is kept with a 0..n-1 index, so the index labels of any slice
+    taken from it are also its row positions; per-row arrays such as
+    ``item_ids`` are looked up with them.
+
+    ``version`` identifies the catalog content (source file hash when the
+    loader recorded one, otherwise a hash of the frame); cached results are
+    keyed on it.
+    """
+
+    def __init__(self, data):
+        if not data.index.equals(pd.RangeIndex(len(data))):
+            data = data.reset_index(drop=True)
+        self.data = data
+        self.n = len(data)
+        source = data.attrs.get("source_sha256")
+        if not source:
+            source = hashlib.sha256(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes()).hexdigest()
+        self.version = f"{CACHE_FORMAT_VERSION}:{source}"
+        self.facets = {}
+        for col in FACET_COLS:
+            if col not in data.columns:
+                continue
+            codes, values = _codes(data[col])
+            self.facets[col] = {v: self.pack(codes == k) for k, v in enumerate(values)}
+        self.flags = {col: self.pack(data[col].to_numpy(dtype=bool))
+                      for col in FLAG_COLS if col in data.columns}
+        self.ranges = {}
+        for col in RANGE_COLS:
+            if col in data.columns and pd.api.types.is_numeric_dtype(data[col]):
+                values = data[col]
+                if col in RANGE_FILL:
+                    values = values.fillna(RANGE_FILL[col])
+                self.ranges[col] = RangeIndex(values.to_numpy())
+        self.orders = {}
+        for col in SORT_COLS:
+            if col in data.columns and pd.api.types.is_numeric_dtype(data[col]):
+                values = data[col].to_numpy(dtype=np.float64, na_value=np.nan)
+                for ascending in (True, False):
+                    order = np.argsort(values if ascending else -values, kind="stable")  # NaN 은 맨 뒤
+                    self.orders[col, ascending] = order.astype(np.int32 if self.n < 2**31 else np.int64)
+        self.item_ids = item_ids(data)
+        self.rule_features = RuleFeatures(data)
+        self.allergy_text = AllergyText.from_frame(data, index_groups=True)
+        self.allergens = {g: self.pack(self.allergy_text.group_mask(g)) for g in ALLERGY_SYNONYMS}
+
+    # --- bitmap helpers ---
+    def pack(self, mask):
+        return np.packbits(np.asarray(mask, dtype=bool))
+
+    def mask(self, bitmap):
+        return np.unpackbits(bitmap, count=self.n).view(bool)
+
+    def rows(self, bitmap):
+        return np.flatnonzero(self.mask(bitmap))
+
+    def from_rows(self, rows):
+        mask = np.zeros(self.n, dtype=bool)
+        mask[rows] = True
+        return self.pack(mask)
+
+    def all_rows(self):
+        return self.pack(np.ones(self.n, dtype=bool))
+
+    def none(self):
+        return np.zeros((self.n + 7) // 8, dtype=np.uint8)
+
+    @staticmethod
+    def count(bitmap):
+        return int(_POPCOUNT[bitmap].sum(dtype=np.int64))
+
+    # --- facets ---
+    def any_of(self, col, values):
+        """Rows whose ``col`` is one of ``values`` (the ``isin`` of the old filters)."""
+        out = self.none()
+        for v in values:
+            bm = self.facets.get(col, {}).get(v)
+            if bm is not None:
+                out |= bm
+        return out
+
+    def facet_counts(self, col, within=None):
+        """``{value: rows}`` for a facet, optionally restricted to the ``within`` bitmap."""
+        if within is None:
+            return {v: self.count(bm) for v, bm in self.facets.get(col, {}).items()}
+        return {v: self.count(bm & within) for v, bm in self.facets.get(col, {}).items()}
+
+    def flag_count(self, col, within=None):
+        bm = self.flags.get(col)
+        if bm is None:
+            return 0
+        return self.count(bm if within is None else bm & within)
+
+    # --- ranges ---
+    def in_range(self, col, lo=None, hi=None):
+        """Bitmap of the rows with ``lo <= col <= hi``, or ``None`` if it keeps every row."""
+        rng = self.ranges[col]
+        start, stop = rng.span(lo, hi)
+        if stop - start == self.n:
+            return None
+        return self.from_rows(rng.order[start:stop])
+
+    def bounds(self, col):
+        rng = self.ranges.get(col)
+        return rng.bounds() if rng is not None else None
+
+    # --- sort orders ---
+    def sort_order(self, col, ascending=True):
+        """All row positions sorted by ``col`` (missing last, stable), or ``None`` if not precomputed."""
+        return self.orders.get((col, ascending))
+
+    # --- item ids ---
+    def item_ids_of(self, df):
+        """Item ids of the rows of ``df``, a slice of ``data`` in any order."""
+        return self.item_ids[df.index.to_numpy()]
+
+    def with_ids(self, df, ids):
+        """Rows of the slice ``df`` whose item id is in ``ids`` (favorites, dislikes), in ``df`` order."""
+        return df[np.isin(self.item_ids_of(df), list(ids))]
+
+    # --- allergens ---
+    def allergen_rows(self, groups=()):
+        """Bitmap of the rows hit by any of the synonym ``groups``."""
+        out = self.none()
+        for g in groups:
+            if g in self.allergens:
+                out |= self.allergens[g]
+        return out
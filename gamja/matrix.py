@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""Ranking many profiles against the catalog at once.
+
+:func:`rank_many` scores P queries as one P × N matrix (N catalog rows):
+each query is a weight vector over the slots of the index's
+:class:`~gamja.scoring.RuleFeatures`, and every rule adds
+``weights[:, codes[rule]]`` to the whole matrix, in ``score_frame``'s
+order, so the sums are the same as scoring each query on its own.  Allergy
+hits are matched once per distinct allergy selection, filters are the
+usual bitmaps.
+
+Only each query's top ``k`` rows are kept.  Queries are scored a block at a
+time, sized so that the block's score matrix and its temporaries stay within
+``memory_budget`` bytes: every rule is added through one reused buffer, and
+the allergy matches are cached per block only, so they are charged to the
+block like the score matrix.  Reason bits are worked out for the kept rows
+only.
+"""
+import numpy as np
+import pandas as pd
+
+from .filters import filter_bitmap
+from .recommend import SORT_KEYS, Ranking, top_k
+from .scoring import R_ALLERGY, R_DISLIKE, R_FAVORITE, REASON_DTYPE, W_ALLERGY, W_DISLIKE, W_FAVORITE
+
+DEFAULT_MEMORY_BUDGET = 64 * 2**20
+# 블록에서 행렬 한 칸이 차지하는 바이트: 점수(float64) + 규칙을 더할 때 다시 쓰는 버퍼(float64)
+# + 알러지/비선호/즐겨찾기 마스크(bool 3개) + 알러지 캐시(찾은 용어 object 포인터 + 해당 여부, 최악에는 질의마다 하나)
+_CELL_BYTES = 8 + 8 + 3 + (8 + 1)
+# 블록과 함께 잠깐 쓰는 카탈로그 행마다의 바이트: np.take 가 복사하는 코드(intp), 질의 하나를 고를 때의
+# argpartition 위치(intp)와 필터 마스크/비교 결과(bool)
+_COLUMN_BYTES = 8 + 8 + 8
+
+
+def query_bitmap(index, query):
+    """Filter bitmap of a canonical query (the rows it ranks)."""
+    return filter_bitmap(index, brands=query["brands"], price_tiers=query["price_tiers"],
+                         textures=query["textures"], proteins=query["proteins"],
+                         price_range=query["price_range"], grain_free=query["grain_free"],
+                         vet_diet=query["vet_diet"])
+
+
+def rank_many(index, queries, k, within=None, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """The best ``k`` rows by score of each canonical query, as :class:`Ranking` objects.
+
+    Each ranking holds only those rows, but orders them exactly like the
+    full ranking :func:`~gamja.recommend.rank` returns (ties in catalog
+    order).  ``within`` is a catalog bitmap that restricts every query
+    further (e.g. the food or treat rows).  Only score sorting is
+    supported; other ``sort_key`` values raise ``ValueError``.
+    """
+    for query in queries:
+        sort = SORT_KEYS[query["sort_key"]]
+        if sort is None or sort[0] != "score":
+            raise ValueError(f"rank_many ranks by score only, not {query['sort_key']!r}")
+    features = index.rule_features
+    if within is None:
+        cols, codes, allergy_text = np.arange(index.n), features.codes, index.allergy_text
+    else:
+        cols = index.rows(within)
+        codes, allergy_text = features.codes[:, cols], index.allergy_text.take(cols)
+    # 즐겨찾기/비선호에 나온 id 의 열만 찾아 둔다 (카탈로그 전체의 id -> 열 사전은 만들지 않는다)
+    wanted = {item_id for q in queries for keys in (q["favorites"], q["dislikes"]) for item_id in keys}
+    id_cols = {}
+    if wanted:
+        ids = index.item_ids[cols]
+        for c in np.flatnonzero(np.fromiter((i in wanted for i in ids), dtype=bool, count=len(ids))):
+            id_cols.setdefault(ids[c], []).append(c)
+        del ids
+    width = max(1, len(cols))
+    fixed = cols.nbytes + codes.nbytes + allergy_text.codes.nbytes + index.n * _COLUMN_BYTES
+    block = max(1, int((memory_budget - fixed) // (width * _CELL_BYTES)))
+    out = []
+    for start in range(0, len(queries), block):
+        # 블록마다 함수 하나: 돌아오면 그 블록의 행렬이 모두 풀린 뒤 다음 블록을 만든다
+        out.extend(_rank_block(index, queries[start:start + block], k, cols, codes, allergy_text, id_cols))
+    return out
+
+
+def _rank_block(index, chunk, k, cols, codes, allergy_text, id_cols):
+    features = index.rule_features
+    weights = np.stack([features.weights(
+        stage=q["stage"], conditions=q["conditions"], activity=q["activity"], selected_prices=q["price_tiers"],
+        selected_textures=q["textures"], selected_proteins=q["proteins"]) for q in chunk])
+    score = np.zeros((len(chunk), len(cols)))
+    buf = np.empty_like(score)
+    active = [r for r, (lo, hi) in enumerate(features.spans) if weights[:, lo:hi].any()]
+    for r in active:
+        np.take(weights, codes[r], axis=1, out=buf, mode="clip")  # mode="raise" 는 out 을 한 벌 더 버퍼링한다
+        score += buf
+
+    allergens = {}  # 블록 안에서 같은 알러지 선택은 한 번만 찾는다: (찾은 용어, 해당 여부)
+    found, hits = [], np.zeros(score.shape, dtype=bool)
+    dislikes, favorites = np.zeros(score.shape, dtype=bool), np.zeros(score.shape, dtype=bool)
+    for i, q in enumerate(chunk):
+        selection = (tuple(q["allergy_groups"]), tuple(q["allergy_terms"]))
+        if selection not in allergens:
+            terms = (allergy_text.match(q["allergy_terms"], q["allergy_groups"])
+                     if any(selection) else np.full(len(cols), None, dtype=object))
+            allergens[selection] = terms, pd.notna(terms)
+        found.append(allergens[selection][0])
+        hits[i] = allergens[selection][1]
+        for marks, keys in ((dislikes, q["dislikes"]), (favorites, q["favorites"])):
+            for item_id in keys:
+                marks[i, id_cols.get(item_id, [])] = True
+    for marks, weight in ((hits, W_ALLERGY), (dislikes, W_DISLIKE), (favorites, W_FAVORITE)):
+        np.multiply(marks, weight, out=buf)
+        score += buf
+    del buf
+
+    np.negative(score, out=score)  # 작을수록 앞 (Ranking.key 와 같은 방향)
+    out = []
+    for i, q in enumerate(chunk):
+        key = score[i]
+        cand = index.mask(query_bitmap(index, q))[cols]
+        key[~cand] = np.inf
+        picks = top_k(key, k)
+        picks = np.sort(picks[cand[picks]])  # 결과 밖의 행을 빼고 카탈로그 순서로
+        bits = np.zeros(len(picks), dtype=REASON_DTYPE)
+        slot_bits = features.bits * (weights[i] != 0)
+        for r in active:
+            bits |= slot_bits[codes[r, picks]]
+        bits |= hits[i, picks] * REASON_DTYPE(R_ALLERGY)
+        bits |= dislikes[i, picks] * REASON_DTYPE(R_DISLIKE)
+        bits |= favorites[i, picks] * REASON_DTYPE(R_FAVORITE)
+        sub = key[picks]
+        out.append(Ranking(cols[picks], -sub, bits, found[i][picks], sub.copy()))
+    return out
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Life stage, daily energy need and serving sizes of one cat.
+
+Plain Python on scalars (no numpy/pandas), so profile-only callers such as
+the form summary do not pay for loading the catalog stack.  Missing catalog
+values (``None``, NaN, ``pd.NA``) give ``None`` servings.
+"""
+import math
+
+# 간식은 하루 열량의 10% 이하
+TREAT_KCAL_SHARE = 0.1
+
+
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def life_stage(age):
+    """Stage name from age in years: "키튼" under 1, "시니어" from 10, else "어덜트" (3 if unknown)."""
+    try:
+        a = float(age)
+    except Exception:
+        a = 3.0
+    return "키튼" if a < 1 else ("어덜트" if a < 10 else "시니어")
+
+
+def estimate_daily_kcal(weight, activity, neutered, stage):
+    """Daily energy need (kcal): RER ``70 * kg^0.75`` adjusted for neutering, activity and stage."""
+    try:
+        w = max(0.5, float(weight))
+    except Exception:
+        w = 4.0
+    rer = 70 * (w ** 0.75)
+    factor = 1.0
+    if neutered == "예":
+        factor -= 0.05
+    if activity == "낮음":
+        factor -= 0.1
+    elif activity == "높음":
+        factor += 0.15
+    if stage == "키튼":
+        factor += 0.25
+    elif stage == "시니어":
+        factor -= 0.05
+    return max(120, int(round(rer * factor)))
+
+
+def treat_budget(daily_kcal):
+    """Treat allowance (kcal/day): ``TREAT_KCAL_SHARE`` of the daily need, rounded down."""
+    return int(daily_kcal * TREAT_KCAL_SHARE)
+
+
+def grams_per_day(daily_kcal, kcal_per_100g):
+    """Grams of a food that cover ``daily_kcal``, or ``None`` without a usable kcal value."""
+    kcal = _number(kcal_per_100g)
+    if kcal is None or kcal <= 0:
+        return None
+    return int(round(daily_kcal / kcal * 100))
+
+
+def pieces_per_day(daily_kcal, kcal_per_piece):
+    """Treat pieces within the treat allowance (at least one), or ``None`` without a usable kcal value."""
+    kcal = _number(kcal_per_piece)
+    if kcal is None or int(kcal) <= 0:
+        return None
+    return max(1, treat_budget(daily_kcal) // int(kcal))
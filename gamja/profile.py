@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""A cat profile, as entered in the apps' form, turned into a recommendation query.
+
+The apps keep the form in ``st.session_state.form``; the API and batch
+tools accept the same keys, so every entry point ranks with the same rules:
+
+``age``, ``weight``, ``neutered`` ("예"/"아니오"), ``activity``
+("낮음"/"보통"/"높음"), ``conditions``, ``base_allergy`` (synonym groups),
+``custom_allergy`` (comma separated free text) and the facet selections
+``sel_brands``, ``sel_prices``, ``sel_textures``, ``sel_proteins`` (empty or
+"전체" means all).
+"""
+from .allergy import resolve_allergies
+from .filters import selected_or_all
+from .nutrition import estimate_daily_kcal, life_stage
+
+PRICE_TIERS = ("저가", "중간", "프리미엄")
+TEXTURES = ("드라이", "습식/파우치")
+PROTEINS = ("닭", "어류", "소", "오리", "양", "칠면조")
+
+
+def allergy_tokens(profile):
+    """Lower-cased allergy tokens of the form: the chosen groups plus the comma separated free text."""
+    custom_tokens = [t.strip() for t in (profile.get("custom_allergy") or "").split(",") if t.strip()]
+    return set([a.lower() for a in profile.get("base_allergy") or []]) | set([t.lower() for t in custom_tokens])
+
+
+def daily_kcal(profile):
+    """Daily energy need of the profiled cat."""
+    stage = life_stage(profile.get("age", 3.0))
+    return estimate_daily_kcal(profile.get("weight", 4.0), profile.get("activity", "보통"),
+                               profile.get("neutered", "예"), stage)
+
+
+def profile_query(index, profile):
+    """The profile's keyword arguments for :func:`gamja.recommend.recommend`.
+
+    Covers the cat (stage, conditions, activity, allergies) and the facet
+    selections; the page-level options (price range, flags, sort order,
+    favorites/dislikes) are passed alongside by the caller.
+    """
+    allergy_groups, allergy_terms = resolve_allergies(allergy_tokens(profile))
+    brands_all = sorted([b for b in index.facets.get("brand", {}) if b])
+    return {
+        "stage": life_stage(profile.get("age", 3.0)),
+        "conditions": profile.get("conditions", []),
+        "activity": profile.get("activity"),
+        "brands": selected_or_all(profile.get("sel_brands", []), brands_all),
+        "price_tiers": selected_or_all(profile.get("sel_prices", []), PRICE_TIERS),
+        "textures": selected_or_all(profile.get("sel_textures", []), TEXTURES),
+        "proteins": selected_or_all(profile.get("sel_proteins", []), PROTEINS),
+        "allergy_groups": allergy_groups,
+        "allergy_terms": allergy_terms,
+    }
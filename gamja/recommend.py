@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""One recommendation query: filter, score and rank the catalog.
+
+:func:`recommend` is the whole results-page pipeline of the apps.  Its
+inputs are first reduced to a canonical query (sets sorted, "전체"
+selections expanded to the values they stand for, a price range covering the
+whole catalog dropped), so equivalent form states share one fingerprint and
+one cached :class:`Ranking`.
+
+Rankings are computed in two layers.  The base ranking ignores the user's
+favorites/dislikes and depends only on the cat profile and filters, so it
+can be shared by every session (``shared_cache``); the favorites/dislikes
+rules, which are the last scoring rules anyway, are then added on top by
+:func:`personalize`, which recomputes the sort key when sorting by score.
+
+A ranking is kept in catalog order with its sort key; ties rank in catalog
+order (a stable sort).  Pages of cards only need the first few rows of a
+large result, which :func:`top_k` selects without sorting the rest.
+"""
+import hashlib
+import json
+
+import numpy as np
+from .filters import filter_bitmap
+from .scoring import apply_preferences, score_rows, with_reasons
+
+# 정렬 기준 -> (정렬 컬럼, 오름차순 여부). None 은 카탈로그 순서 그대로
+SORT_KEYS = {
+    "추천순(점수)": ("score", False),
+    "가격 낮은순": ("price_krw", True),
+    "가격 높은순": ("price_krw", False),
+    "kcal 낮은순": ("kcal_per_100g", True),
+    "kcal 높은순": ("kcal_per_100g", False),
+    None: None,
+}
+DEFAULT_SORT = "추천순(점수)"
+
+
+def top_k(key, k):
+    """Positions of the ``k`` smallest ``key`` values, smallest first.
+
+    Same result as ``np.argsort(key, kind="stable")[:k]`` (NaN last, ties in
+    position order), found with ``np.argpartition`` and a sort of the ``k``
+    survivors only.
+    """
+    n = len(key)
+    if k is None or k >= n:
+        return np.argsort(key, kind="stable")
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    cut = key[np.argpartition(key, k - 1)[:k]].max()  # k 번째로 작은 값 (partition 은 NaN 을 맨 뒤로 보냄)
+    if key.dtype.kind == "f" and np.isnan(cut):
+        better, tied = ~np.isnan(key), np.isnan(key)
+    else:
+        better, tied = key < cut, key == cut
+    # 경계값과 같은 행은 앞쪽 위치부터 남은 자리만큼 (안정 정렬의 동점 순서)
+    better = np.flatnonzero(better)
+    picked = np.concatenate([better, np.flatnonzero(tied)[:k - len(better)]])
+    picked.sort()
+    return picked[np.argsort(key[picked], kind="stable")]
+
+
+class Ranking:
+    """A scored result: catalog row positions (in catalog order) with their score columns.
+
+    ``allergen`` is ``None`` when the query has no allergies (see
+    :meth:`allergen_of`).  ``key`` is the sort key per row, arranged so
+    that smaller is better (``None`` keeps catalog order); :meth:`positions`
+    ranks by it, ties in catalog order.  The top rows alone are a partial
+    selection (:func:`top_k`).  Nothing is computed into the object after it is built:
+    rankings sit in caches shared by sessions, whose byte accounting is taken
+    at insertion, so every order is derived per call.
+
+    Sorting by a column the index keeps presorted passes that catalog-wide
+    permutation as ``perm`` instead of a key: the ranked rows are read off
+    it in growing chunks, through a byte mask of the result's catalog rows,
+    until enough are found.
+    """
+
+    __slots__ = ("rows", "score", "reason_bits", "allergen", "key", "perm")
+
+    def __init__(self, rows, score, reason_bits, allergen, key=None, perm=None):
+        # 캐시에 들어가 여러 세션이 함께 읽으므로 읽기 전용으로 둔다
+        for arr in (rows, score, reason_bits, allergen, key):
+            if arr is not None:
+                arr.flags.writeable = False
+        self.rows = rows
+        self.score = score
+        self.reason_bits = reason_bits
+        self.allergen = allergen
+        self.key = key
+        self.perm = perm  # 인덱스가 가진 배열을 공유하므로 nbytes 에 넣지 않는다
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def nbytes(self):
+        """Bytes of the arrays held (not ``perm``); the size the rank caches count against ``max_bytes``."""
+        arrays = (self.rows, self.score, self.reason_bits, self.allergen, self.key)
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def allergen_of(self, pos):
+        """Allergy term found in the rows at ``pos`` (``None`` each if the query had no allergies)."""
+        if self.allergen is None:
+            return np.full(len(pos), None, dtype=object)
+        return self.allergen[pos]
+
+    def order(self):
+        """Positions of all rows, best first."""
+        return self.positions()
+
+    def positions(self, top=None, where=None):
+        """Positions of the best ``top`` rows (all if ``None``), best first.
+
+        ``where`` restricts the candidates to a boolean mask aligned with ``rows``.
+        """
+        if self.perm is not None:
+            return self._stream(top, where)
+        cand = None if where is None else np.flatnonzero(where)
+        if self.key is None:
+            return (np.arange(len(self.rows)) if cand is None else cand)[:top]
+        if cand is None:
+            return top_k(self.key, top)
+        return cand[top_k(self.key[cand], top)]
+
+    def _stream(self, top=None, where=None):
+        pos = np.arange(len(self.rows)) if where is None else np.flatnonzero(where)
+        rows = self.rows[pos]
+        if not len(rows):
+            return np.empty(0, dtype=np.int64)
+        if top is None:
+            # 전체 순서는 어차피 perm 전체를 훑으므로 perm 과 같은 폭의 표로 한 번에 옮긴다
+            slot = np.full(len(self.perm), -1, dtype=self.perm.dtype)
+            slot[rows] = pos
+            found = slot[self.perm]
+            return found[found >= 0].astype(np.int64)
+
+        # 페이지 하나는 카탈로그 행마다 1바이트인 표시만 두고 perm 을 조각조각 거른다.
+        # 결과 행이 perm 뒤쪽에 몰려 있어도 조각마다 한 번의 인덱싱이라 전체를 훑어도 싸다
+        hit = np.zeros(len(self.perm), dtype=bool)
+        hit[rows] = True
+        chunks, count, start, step = [], 0, 0, max(1024, 4 * top)
+        while count < top and start < len(self.perm):
+            part = self.perm[start:start + step]
+            part = part[hit[part]]
+            chunks.append(part)
+            count += len(part)
+            start += step
+            step *= 2
+        found = np.concatenate(chunks)[:top] if chunks else np.empty(0, dtype=np.int64)
+        # rows 는 카탈로그 순서라 찾은 행의 결과 내 위치는 이진 탐색으로
+        return pos[np.searchsorted(rows, found)]
+
+    def frame(self, index, top=None, where=None, ordered=True):
+        """The rows as a catalog frame with ``score``/``reason_bits``/``allergen`` columns.
+
+        Best first (``ordered=False``: catalog order), see :meth:`positions`.
+        """
+        if ordered:
+            pos = self.positions(top, where)
+        else:
+            pos = (np.arange(len(self.rows)) if where is None else np.flatnonzero(where))[:top]
+        return index.data.take(self.rows[pos]).assign(score=self.score[pos], reason_bits=self.reason_bits[pos],
+                                                      allergen=self.allergen_of(pos))
+
+    def mask(self, index, bitmap):
+        """A catalog bitmap as a ``where`` mask for this ranking."""
+        return index.mask(bitmap)[self.rows]
+
+    def with_ids(self, index, ids):
+        """A ``where`` mask of the rows whose item id is in ``ids`` (favorites, dislikes)."""
+        return np.isin(index.item_ids[self.rows], list(ids))
+
+
+def _canonical_set(values):
+    return sorted({str(v) for v in values or ()})
+
+
+def canonical_query(index, *, stage, conditions=(), activity=None,
+                    brands=(), price_tiers=(), textures=(), proteins=(), price_range=None,
+                    grain_free=False, vet_diet=False, allergy_groups=(), allergy_terms=(),
+                    favorites=(), dislikes=(), sort_key=DEFAULT_SORT):
+    """The query as a plain, order-independent dict (the memoisation key).
+
+    Facet selections are the effective values after ``selected_or_all``
+    (so "전체" and an explicit full selection are the same query).
+    """
+    if sort_key not in SORT_KEYS:
+        raise ValueError(f"unknown sort key: {sort_key!r}")
+    if price_range is not None:
+        price_range = [float(price_range[0]), float(price_range[1])]
+        bounds = index.bounds("price_krw")
+        if bounds is None or (price_range[0] <= bounds[0] and price_range[1] >= bounds[1]):
+            price_range = None
+    return {
+        "stage": stage, "conditions": _canonical_set(conditions), "activity": activity,
+        "brands": _canonical_set(brands), "price_tiers": _canonical_set(price_tiers),
+        "textures": _canonical_set(textures), "proteins": _canonical_set(proteins),
+        "price_range": price_range, "grain_free": bool(grain_free), "vet_diet": bool(vet_diet),
+        "allergy_groups": _canonical_set(allergy_groups), "allergy_terms": _canonical_set(allergy_terms),
+        "favorites": _canonical_set(favorites), "dislikes": _canonical_set(dislikes),
+        "sort_key": sort_key,
+    }
+
+
+def base_query(query):
+    """The part of a canonical query the shared base ranking depends on."""
+    return dict(query, favorites=[], dislikes=[])
+
+
+def query_fingerprint(index, query):
+    """Stable hash of a canonical query against one catalog version."""
+    payload = json.dumps([index.version, query], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _sort_key(index, query, rows, scores):
+    sort = SORT_KEYS[query["sort_key"]]
+    if sort is None or index.sort_order(*sort) is not None:
+        return None
+    col, ascending = sort
+    if col == "score":
+        key = scores
+    elif col in index.data.columns:
+        key = index.data[col].to_numpy()[rows]
+    else:
+        return None
+    # 작을수록 앞: 내림차순은 부호를 뒤집는다 (float64 는 원래 값을 그대로 담고, 결측은 NaN 으로 맨 뒤)
+    key = np.asarray(key, dtype=np.float64)
+    return key if ascending else -key
+
+
+def rank(index, query):
+    """Run a canonical query against the catalog (no caching)."""
+    rows = index.rows(filter_bitmap(
+        index, brands=query["brands"], price_tiers=query["price_tiers"], textures=query["textures"],
+        proteins=query["proteins"], price_range=query["price_range"],
+        grain_free=query["grain_free"], vet_diet=query["vet_diet"]))
+    # 필터가 카탈로그 전체를 남기면 규칙 표·알러지 텍스트를 행 위치로 복사하지 않고 그대로 읽는다
+    subset = None if len(rows) == index.n else rows
+    allergy_text = None
+    if query["allergy_groups"] or query["allergy_terms"]:
+        allergy_text = index.allergy_text if subset is None else index.allergy_text.take(subset)
+    ids = index.item_ids[rows] if query["favorites"] or query["dislikes"] else None
+    scores, bits, allergen = score_rows(
+        index.rule_features, subset, stage=query["stage"], conditions=query["conditions"],
+        activity=query["activity"], selected_prices=query["price_tiers"], selected_textures=query["textures"],
+        selected_proteins=query["proteins"], allergy_groups=query["allergy_groups"],
+        allergy_terms=query["allergy_terms"], allergy_text=allergy_text,
+        favorites=query["favorites"], dislikes=query["dislikes"], ids=ids)
+    sort = SORT_KEYS[query["sort_key"]]
+    return Ranking(rows, scores, bits, allergen, _sort_key(index, query, rows, scores),
+                   index.sort_order(*sort) if sort is not None else None)
+
+
+def personalize(index, base, query):
+    """Add the query's favorites/dislikes to a base ranking of the same query.
+
+    Gives exactly what :func:`rank` returns for the full query.
+    """
+    if not query["favorites"] and not query["dislikes"]:
+        return base
+    scores, bits = base.score.copy(), base.reason_bits.copy()
+    apply_preferences(scores, bits, index.item_ids[base.rows], query["favorites"], query["dislikes"])
+    key = base.key
+    if SORT_KEYS[query["sort_key"]] is not None and SORT_KEYS[query["sort_key"]][0] == "score":
+        key = _sort_key(index, query, base.rows, scores)
+    return Ranking(base.rows, scores, bits, base.allergen, key, base.perm)
+
+
+def personalize_table(table, index, ranking, where):
+    """The decoded table of ``ranking`` from that of its base ranking.
+
+    ``table`` is ``with_reasons(base.frame(index, ordered=False))`` for the
+    base ranking ``ranking`` was personalized from, and ``where`` marks the
+    favorites/dislikes (:meth:`Ranking.with_ids`), the only rows whose score
+    and reasons differ.  Only those are decoded again; the result equals
+    ``with_reasons(ranking.frame(index, ordered=False))``.
+    """
+    pos = np.flatnonzero(where)
+    if not len(pos):
+        return table
+    patch = with_reasons(ranking.frame(index, where=where, ordered=False))
+    score = table["score"].to_numpy(copy=True)
+    score[pos] = patch["score"].to_numpy()
+    reasons = table["reasons"].to_numpy(copy=True)
+    for p, labels in zip(pos, patch["reasons"]):
+        reasons[p] = labels
+    return table.assign(score=score, reasons=reasons)
+
+
+def recommend(index, cache=None, shared_cache=None, **params):
+    """The :class:`Ranking` of one query.
+
+    ``cache`` (an ``LRUCache``, typically per session) memoises the final
+    ranking by the full query; ``shared_cache`` (process-wide) memoises the
+    base ranking without favorites/dislikes.  ``params`` are the keyword
+    arguments of :func:`canonical_query`.
+    """
+    query = canonical_query(index, **params)
+    key = query_fingerprint(index, query)
+    ranking = cache.get(key) if cache is not None else None
+    if ranking is None:
+        base_q = base_query(query)
+        base_key = query_fingerprint(index, base_q)
+        base = shared_cache.get(base_key) if shared_cache is not None else None
+        if base is None:
+            base = rank(index, base_q)
+            if shared_cache is not None:
+                shared_cache.put(base_key, base)
+        ranking = personalize(index, base, query)
+        if cache is not None:
+            cache.put(key, ranking)
+    return ranking
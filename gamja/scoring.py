@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""Column-oriented recommendation scoring.
+
+Implements the same rules as the per-row ``score_row`` of the v5/v6 apps.
+Everything a rule looks at that does not depend on the cat (facet values,
+tags, nutrient thresholds) is evaluated once per catalog into a compact
+:class:`RuleFeatures` table; a profile only picks weights for the table's
+columns, so scoring it is a sum of the few columns its stage, conditions and
+selections switch on, plus the allergy rule.  Rules are added in the
+original order so the floating point sums (and therefore the ranking) are
+identical.
+
+Reasons are not stored as strings: every rule owns one bit of an integer
+``reason_bits`` column, and the Korean labels are only produced by
+:func:`decode_reasons` for the rows that are actually shown or exported.
+
+The allergy rule is resolved through :class:`~gamja.allergy.AllergyText`
+(precomputed synonym-group matches plus one compiled pattern for free-text
+terms); the term that matched is kept for the reason label.
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from .allergy import AllergyText
+
+# 점수 가중치 (score_row 와 동일)
+W_PREFERENCE = 0.5
+W_STAGE = 1.5
+W_LOW_KCAL = 1.5
+W_HIGH_MOISTURE = 1.5
+W_LOW_MG = 1.0
+W_LOW_P = 1.0
+W_OK_NA = 0.8
+W_DIGESTION = 1.0
+W_HAIRBALL = 1.0
+W_ACTIVITY = 0.7
+W_HIGH_PROTEIN = 0.6
+W_ALLERGY = -5.0
+W_DISLIKE = -2.0
+W_FAVORITE = 0.5
+
+# 추천 이유 비트 (score_row 가 이유를 붙이던 순서 그대로)
+R_PRICE = 1 << 0
+R_TEXTURE = 1 << 1
+R_PROTEIN = 1 << 2
+R_KITTEN = 1 << 3
+R_SENIOR = 1 << 4
+R_LOW_KCAL = 1 << 5
+R_HIGH_MOISTURE = 1 << 6
+R_LOW_MG = 1 << 7
+R_LOW_P = 1 << 8
+R_OK_NA = 1 << 9
+R_DIGESTION = 1 << 10
+R_HAIRBALL = 1 << 11
+R_ACTIVITY = 1 << 12
+R_HIGH_PROTEIN = 1 << 13
+R_ALLERGY = 1 << 14
+R_DISLIKE = 1 << 15
+R_FAVORITE = 1 << 16
+
+REASON_LABELS = {
+    R_PRICE: "{price_tier} 가격",
+    R_TEXTURE: "{texture} 형태",
+    R_PROTEIN: "{protein} 단백질",
+    R_KITTEN: "키튼용",
+    R_SENIOR: "시니어용",
+    R_LOW_KCAL: "저칼로리",
+    R_HIGH_MOISTURE: "높은 수분",
+    R_LOW_MG: "Mg 낮음",
+    R_LOW_P: "낮은 인",
+    R_OK_NA: "적절한 Na",
+    R_DIGESTION: "소화에 순함",
+    R_HAIRBALL: "헤어볼 관리",
+    R_ACTIVITY: "활동량 높음 적합",
+    R_HIGH_PROTEIN: "고단백",
+    R_ALLERGY: "{allergen} 포함",
+    R_DISLIKE: "비선호 항목",
+    R_FAVORITE: "즐겨찾기 가산",
+}
+# 어떤 성분이 걸렸는지 모를 때(allergen 컬럼 없음)의 알러지 이유
+ALLERGY_FALLBACK_LABEL = "알러지 의심 성분"
+REASON_DTYPE = np.uint32
+_REASON_FIELDS = ("price_tier", "texture", "protein", "allergen")
+
+# 선호 규칙: 선택한 값이면 W_PREFERENCE (규칙 순서대로)
+PREFERENCE_RULES = (("price_tier", R_PRICE), ("texture", R_TEXTURE), ("protein", R_PROTEIN))
+# 그다음 규칙들: (이름, 가중치, 이유 비트, 켜는 선택). 켜는 선택은 ("stage", 단계),
+# ("condition", 질환), ("activity", 활동량) 이고 None 은 항상 적용
+PROFILE_RULES = (
+    ("kitten", W_STAGE, R_KITTEN, ("stage", "키튼")),
+    ("senior", W_STAGE, R_SENIOR, ("stage", "시니어")),
+    ("low_kcal", W_LOW_KCAL, R_LOW_KCAL, ("condition", "비만 경향")),
+    ("high_moisture", W_HIGH_MOISTURE, R_HIGH_MOISTURE, ("condition", "FLUTD/요로기계")),
+    ("low_mg", W_LOW_MG, R_LOW_MG, ("condition", "FLUTD/요로기계")),
+    ("low_p", W_LOW_P, R_LOW_P, ("condition", "신장 질환(CKD)")),
+    ("ok_na", W_OK_NA, R_OK_NA, ("condition", "신장 질환(CKD)")),
+    ("digestion", W_DIGESTION, R_DIGESTION, ("condition", "소화 민감성/IBD")),
+    ("hairball", W_HAIRBALL, R_HAIRBALL, ("condition", "헤어볼")),
+    ("activity", W_ACTIVITY, R_ACTIVITY, ("activity", "높음")),
+    ("high_protein", W_HIGH_PROTEIN, R_HIGH_PROTEIN, None),
+)
+
+# 임계값
+LOW_KCAL_MAX = 330
+HIGH_KCAL_MIN = 360
+HIGH_MOISTURE_MIN = 70
+FLUTD_MAGNESIUM_MAX = 25
+CKD_PHOSPHORUS_MAX = 0.6
+CKD_SODIUM_MAX = 0.4
+
+
+def _num(df, col):
+    # 저장 dtype(float32/정수)을 유지해야 0.6 같은 임계값 비교가 원본과 같게 나온다
+    if col not in df.columns:
+        return np.full(len(df), np.nan)
+    values = df[col]
+    if not pd.api.types.is_numeric_dtype(values):
+        values = pd.to_numeric(values, errors="coerce")
+    return values.to_numpy()
+
+
+class _TextColumn:
+    """A text column factorised once, so string rules run per distinct value."""
+
+    def __init__(self, df, col):
+        if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+            self.codes = df[col].cat.codes.to_numpy()
+            self.uniques = np.asarray([str(u) for u in df[col].cat.categories], dtype=object)
+        elif col in df.columns:
+            self.codes, uniques = pd.factorize(df[col])
+            self.uniques = np.asarray([str(u) for u in uniques], dtype=object)
+        else:
+            self.codes = np.zeros(len(df), dtype=np.intp)
+            self.uniques = np.asarray([""], dtype=object)
+
+    def mask(self, predicate):
+        hit = np.fromiter((predicate(u) for u in self.uniques), dtype=bool, count=len(self.uniques))
+        # factorize 는 결측을 -1 로 표시하므로 마지막에 False 를 붙여 둔다
+        return np.append(hit, False)[self.codes]
+
+    def has_tag(self, tag):
+        return self.mask(lambda t: tag in t.split(";"))
+
+
+def item_ids(df):
+    """Stable ``<sku or name>-<md5[:8]>`` id of every row (the favorites/dislikes key)."""
+    def col(c):
+        return df[c].tolist() if c in df.columns else [None] * len(df)
+    out = []
+    for sku, name, brand, url in zip(col("sku"), col("name"), col("brand"), col("product_url")):
+        base = str(sku or name or f"{brand}_{url}")
+        out.append(f"{base}-{hashlib.md5(base.encode('utf-8')).hexdigest()[:8]}")
+    return np.asarray(out, dtype=object)
+
+
+def _rule_hits(df, texture, tags):
+    # 프로필과 무관한 규칙이 켜졌을 때 해당하는 행 (PROFILE_RULES 의 이름별)
+    kcal100 = _num(df, "kcal_per_100g")
+    wet = texture.mask(lambda t: t.startswith("습식"))
+    return {
+        "kitten": tags.has_tag("키튼"),
+        "senior": tags.has_tag("시니어"),
+        "low_kcal": kcal100 <= LOW_KCAL_MAX,
+        "high_moisture": wet | (_num(df, "moisture_pct") >= HIGH_MOISTURE_MIN),
+        "low_mg": _num(df, "magnesium_mg_per_100kcal") <= FLUTD_MAGNESIUM_MAX,
+        "low_p": _num(df, "phosphorus_pct_dm") <= CKD_PHOSPHORUS_MAX,
+        "ok_na": _num(df, "sodium_pct_dm") <= CKD_SODIUM_MAX,
+        "digestion": tags.has_tag("소화 민감성"),
+        "hairball": tags.has_tag("헤어볼"),
+        "activity": kcal100 >= HIGH_KCAL_MIN,
+        "high_protein": tags.has_tag("고단백"),
+    }
+
+
+class RuleFeatures:
+    """Every rule before the allergy rule, evaluated once per catalog row.
+
+    ``codes`` has one row per rule (``PREFERENCE_RULES`` then
+    ``PROFILE_RULES``, in ``score_row``'s order): the value index of the
+    price tier, texture or protein for the preference rules, hit or not for
+    the stage/condition/activity rules.  The codes of all rules share one
+    slot numbering (rule ``r`` owns ``spans[r]``), so a profile is one weight
+    vector over the slots (:meth:`weights`), and ``weights[codes[r]]`` is
+    rule ``r``'s contribution to every row.  ``bits`` holds the reason bit
+    of each slot, so the reasons come from the same table as the score.
+    """
+
+    def __init__(self, df):
+        texture = _TextColumn(df, "texture")
+        columns = {"price_tier": _TextColumn(df, "price_tier"), "texture": texture,
+                   "protein": _TextColumn(df, "protein")}
+        hits = _rule_hits(df, texture, _TextColumn(df, "tags"))
+        self.values, self.spans, codes, bits = {}, [], [], []
+        offset = 0
+        for rule, bit in PREFERENCE_RULES:
+            col = columns[rule]
+            self.values[rule] = list(col.uniques)
+            # 결측(-1)은 값 목록 뒤의 빈 슬롯으로
+            codes.append(np.where(col.codes < 0, len(col.uniques), col.codes) + offset)
+            self.spans.append((offset, offset + len(col.uniques) + 1))
+            offset += len(col.uniques) + 1
+            bits.append(bit)
+        for rule, _, bit, _ in PROFILE_RULES:
+            codes.append(np.asarray(hits[rule], dtype=bool) + offset)
+            self.spans.append((offset, offset + 2))
+            offset += 2
+            bits.append(bit)
+        self.slots = offset
+        self.codes = np.stack(codes).astype(np.uint8 if offset <= 256 else np.int32)
+        self.bits = np.zeros(offset, dtype=REASON_DTYPE)
+        for (lo, hi), bit in zip(self.spans, bits):
+            self.bits[lo:hi] = bit
+        self._slot = {rule: self.spans[len(PREFERENCE_RULES) + k][0] + 1
+                      for k, (rule, *_) in enumerate(PROFILE_RULES)}
+
+    def __len__(self):
+        return self.codes.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.bits.nbytes
+
+    def weights(self, *, stage, conditions=(), activity=None,
+                selected_prices=(), selected_textures=(), selected_proteins=()):
+        """Weight of every slot for one profile (``score_frame`` arguments); 0 where no rule fires."""
+        w = np.zeros(self.slots)
+        selected = {"stage": {stage}, "condition": set(conditions or []), "activity": {activity}}
+        for (rule, _), (lo, _), chosen in zip(PREFERENCE_RULES, self.spans,
+                                              (selected_prices, selected_textures, selected_proteins)):
+            chosen = set(chosen)
+            for k, value in enumerate(self.values[rule]):
+                if value in chosen:
+                    w[lo + k] = W_PREFERENCE
+        for rule, weight, _, trigger in PROFILE_RULES:
+            if trigger is None or trigger[1] in selected[trigger[0]]:
+                w[self._slot[rule]] = weight
+        return w
+
+    def score(self, weights, rows=None):
+        """``(scores, reason_bits)`` of ``rows`` (all if ``None``) under a weight vector.
+
+        Only the rules with a non-zero weight are added, in rule order; the
+        others would add ``0.0``, so the sums are those of ``score_row``.
+        """
+        n = len(self) if rows is None else len(rows)
+        score = np.zeros(n)
+        bits = np.zeros(n, dtype=REASON_DTYPE)
+        slot_bits = self.bits * (weights != 0)
+        for r, (lo, hi) in enumerate(self.spans):
+            if not weights[lo:hi].any():
+                continue
+            codes = self.codes[r] if rows is None else self.codes[r, rows]
+            np.add(score, weights[codes], out=score)
+            np.bitwise_or(bits, slot_bits[codes], out=bits)
+        return score, bits
+
+
+def score_rows(features, rows=None, *, stage, conditions=(), activity=None,
+               selected_prices=(), selected_textures=(), selected_proteins=(),
+               allergy_groups=(), allergy_terms=(), allergy_text=None, favorites=(), dislikes=(), ids=None):
+    """:func:`score_frame` for ``rows`` of a precomputed :class:`RuleFeatures` (all rows if ``None``).
+
+    The profile's rules are a sum of table columns; only the allergy rule and
+    favorites/dislikes look at the rows themselves, through ``allergy_text``
+    and ``ids`` of the same rows (needed only when those rules are used).
+    Returns what :func:`score_frame` does.
+    """
+    weights = features.weights(stage=stage, conditions=conditions, activity=activity,
+                               selected_prices=selected_prices, selected_textures=selected_textures,
+                               selected_proteins=selected_proteins)
+    score, bits = features.score(weights, rows)
+    allergen = None
+    if allergy_groups or allergy_terms:
+        allergen = allergy_text.match(allergy_terms, allergy_groups)
+        hit = pd.notna(allergen)
+        np.add(score, hit * W_ALLERGY, out=score)
+        np.bitwise_or(bits, hit * REASON_DTYPE(R_ALLERGY), out=bits)
+    if favorites or dislikes:
+        apply_preferences(score, bits, ids, favorites, dislikes)
+    return score, bits, allergen
+
+
+def score_frame(df, *, stage, conditions=(), activity=None,
+                selected_prices=(), selected_textures=(), selected_proteins=(),
+                allergy_groups=(), allergy_terms=(), allergy_text=None, favorites=(), dislikes=(), ids=None):
+    """Apply every scoring rule to ``df`` column-wise.
+
+    Allergies are given as ``ALLERGY_SYNONYMS`` groups plus free-text terms
+    (see :func:`~gamja.allergy.resolve_allergies`).  ``allergy_text`` is the
+    precomputed :class:`~gamja.allergy.AllergyText` of ``df``'s rows
+    (``CatalogIndex.allergy_text.take(...)``); it is built here when omitted.
+    Likewise ``ids`` are the precomputed item ids of the rows
+    (``CatalogIndex.item_ids_of(df)``), matched against ``favorites`` and
+    ``dislikes``.  Slices of an indexed catalog are scored faster by
+    :func:`score_rows` on ``CatalogIndex.rule_features``.
+
+    Returns ``(scores, reason_bits, allergen)``: a float ndarray aligned with
+    ``df``, the matching ``REASON_DTYPE`` array with one bit per rule that
+    fired, and an object array with the allergy term found in each row
+    (``None`` where the allergy rule did not fire), itself ``None`` when no
+    allergies are given.
+    """
+    if (allergy_groups or allergy_terms) and allergy_text is None:
+        allergy_text = AllergyText.from_frame(df)
+    if (favorites or dislikes) and ids is None:
+        ids = item_ids(df)
+    return score_rows(RuleFeatures(df), stage=stage, conditions=conditions, activity=activity,
+                      selected_prices=selected_prices, selected_textures=selected_textures,
+                      selected_proteins=selected_proteins, allergy_groups=allergy_groups,
+                      allergy_terms=allergy_terms, allergy_text=allergy_text, favorites=favorites,
+                      dislikes=dislikes, ids=ids)
+
+
+def apply_preferences(score, bits, ids, favorites=(), dislikes=()):
+    """Add the per-user dislike/favorite rules in place (the last rules of ``score_frame``).
+
+    Because they come last, applying them to a cached base score gives the
+    same sums as scoring with them from the start.
+    """
+    for keys, weight, bit in ((dislikes, W_DISLIKE, R_DISLIKE), (favorites, W_FAVORITE, R_FAVORITE)):
+        mask = np.isin(ids, list(keys))
+        np.add(score, mask * weight, out=score)
+        np.bitwise_or(bits, mask * REASON_DTYPE(bit), out=bits)
+
+
+def decode_reasons(bits, row):
+    """Reason labels for one row, in the order ``score_row`` produced them."""
+    bits = int(bits)
+    fields = {k: row.get(k) for k in _REASON_FIELDS}
+    labels = []
+    for bit, label in REASON_LABELS.items():
+        if not bits & bit:
+            continue
+        if bit == R_ALLERGY and not fields["allergen"]:
+            label = ALLERGY_FALLBACK_LABEL
+        labels.append(label.format(**fields))
+    return labels
+
+
+def with_reasons(df):
+    """Return ``df`` with its ``reason_bits`` column decoded into ``reasons`` lists.
+
+    The helper ``allergen`` column is consumed as well.  Only meant for the
+    (small) frames that are rendered or exported.
+    """
+    if "reason_bits" not in df.columns:
+        return df
+    fields = [df[c].tolist() if c in df.columns else [None] * len(df) for c in _REASON_FIELDS]
+    reasons = [decode_reasons(b, dict(zip(_REASON_FIELDS, values)))
+               for b, *values in zip(df["reason_bits"].tolist(), *fields)]
+    out = df.drop(columns="reason_bits")
+    out.insert(df.columns.get_loc("reason_bits"), "reasons", reasons)
+    return out.drop(columns="allergen", errors="ignore")
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""Recommendation requests as plain dicts, shared by the HTTP API and batch tools.
+
+A request is a profile with the form keys of :mod:`gamja.profile` plus the
+page options ``price_min``/``price_max``, ``grain_free``, ``vet_diet``,
+``sort_key``, ``favorites``/``dislikes`` (item ids), ``limit`` (or
+``food_limit``/``treat_limit``) and ``offset``.  The answer holds the food
+and treat picks with score, reasons and grams/day or pieces/day, in JSON
+types.  Rankings come from the same :func:`recommend` and
+:func:`profile_query` the apps use, or from :func:`~gamja.matrix.rank_many`
+for many requests at once; page items are read from column arrays taken once
+per catalog, so a request never copies catalog rows.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from .cache import LRUCache
+from .index import FACET_COLS
+from .nutrition import grams_per_day, pieces_per_day, treat_budget
+from .profile import daily_kcal, profile_query
+from .matrix import query_bitmap, rank_many
+from .recommend import SORT_KEYS, canonical_query, recommend
+from .scoring import decode_reasons
+
+LIST_FIELDS = ("conditions", "base_allergy", "sel_brands", "sel_prices", "sel_textures", "sel_proteins",
+               "favorites", "dislikes")
+BOOL_FIELDS = ("grain_free", "vet_diet")
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 120  # 앱의 "최대 표시 수" 상한과 같다
+ITEM_COLS = ("sku", "brand", "name", "type", "texture", "protein", "price_tier", "price_krw", "kcal_per_100g",
+             "treat_kcal_per_piece", "tags", "product_url")
+
+
+class RequestError(ValueError):
+    """An invalid request parameter; ``status`` is the matching HTTP status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _jsonable(value):
+    if isinstance(value, np.floating) and value.dtype.itemsize < 8:
+        value = float(str(value))  # float32 은 최단 표현으로 (0.73 이 0.7300000190734863 이 되지 않게)
+    elif isinstance(value, np.generic):
+        value = value.item()
+    if value is None or value is pd.NA or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value
+
+
+def _int(params, name, default, lo, hi):
+    value = params.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise RequestError(f"{name} must be an integer")
+    try:
+        value = int(value)
+    except (OverflowError, ValueError):
+        raise RequestError(f"{name} must be an integer") from None
+    return min(max(value, lo), hi)
+
+
+def _number(params, name):
+    """``params[name]`` as a finite float, ``None`` if missing."""
+    value = params.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise RequestError(f"{name} must be a number")
+    try:
+        value = float(value)
+    except (OverflowError, ValueError):
+        raise RequestError(f"{name} must be a number") from None
+    if not math.isfinite(value):
+        raise RequestError(f"{name} must be a finite number")
+    return value
+
+
+def _str(params, name):
+    """``params[name]`` if it is a string (or missing: ``None``)."""
+    value = params.get(name)
+    if value is not None and not isinstance(value, str):
+        raise RequestError(f"{name} must be a string")
+    return value
+
+
+def parse_bool(value):
+    """A boolean field: strings are true for "1", "true", "y", "yes" and "예"."""
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "y", "yes", "예")
+    return bool(value)
+
+
+def parse_list(value, name=None):
+    """A list field: a list of strings or one string, comma separated values split."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    elif not isinstance(value, (list, tuple)):
+        raise RequestError(f"{name} must be a list of strings")
+    out = []
+    for v in value:
+        if not isinstance(v, str):
+            raise RequestError(f"{name} must be a list of strings")
+        out.extend(t.strip() for t in v.split(",") if t.strip())
+    return out
+
+
+class RecommendService:
+    """Recommendations, product lookups and facets over one shared :class:`CatalogIndex`."""
+
+    def __init__(self, index, cache=None):
+        self.index = index
+        self.cache = cache if cache is not None else LRUCache(maxsize=1024, ttl=1800, max_bytes=256 * 2**20)
+        self._sku_rows = None
+        # 응답에 쓰는 컬럼은 한 번만 numpy 배열로 꺼내 두고 요청마다 행 위치로 읽는다 (프레임 복사 없음)
+        self._columns = {c: index.data[c].to_numpy() for c in ITEM_COLS if c in index.data.columns}
+        self._kinds = {"food": index.any_of("type", ["사료"]), "treat": index.any_of("type", ["간식"])}
+
+    def _items(self, ranking, where, daily, limit, offset, is_treat, total=None):
+        columns = self._columns
+        pos = ranking.positions(offset + limit, where)[offset:]
+        rows = ranking.rows[pos]
+        items = []
+        for p, r, allergen in zip(pos, rows, ranking.allergen_of(pos)):
+            row = {c: values[r] for c, values in columns.items()}
+            row["allergen"] = allergen
+            item = {"id": self.index.item_ids[r], **{c: _jsonable(row[c]) for c in ITEM_COLS if c in row}}
+            item["tags"] = [t for t in str(row.get("tags") or "").split(";") if t and t != "nan"]
+            item["score"] = round(float(ranking.score[p]), 2)
+            item["reasons"] = decode_reasons(ranking.reason_bits[p], row)
+            if is_treat:
+                item["pieces_per_day"] = pieces_per_day(daily, row.get("treat_kcal_per_piece"))
+            else:
+                item["grams_per_day"] = grams_per_day(daily, row.get("kcal_per_100g"))
+            items.append(item)
+        return {"total": int(where.sum()) if total is None else total, "items": items}
+
+    def _parse(self, params):
+        """Validated ``params``: the :func:`recommend` keyword arguments and the page options.
+
+        Every field is type-checked (lists of strings, strings, finite
+        numbers), so a malformed request is a :class:`RequestError` naming
+        the field; ``params`` itself is left as it was.
+        """
+        index = self.index
+        profile = {key: parse_list(params.get(key), key) for key in LIST_FIELDS}
+        for key, read in (("activity", _str), ("neutered", _str), ("custom_allergy", _str),
+                          ("age", _number), ("weight", _number)):
+            value = read(params, key)
+            if value is not None:  # 빠진 값은 profile 의 기본값으로
+                profile[key] = value
+        for key in BOOL_FIELDS:
+            value = params.get(key)
+            if value is not None and not isinstance(value, (bool, int, str)):
+                raise RequestError(f"{key} must be a boolean")
+            profile[key] = parse_bool(value)
+        lo, hi = _number(params, "price_min"), _number(params, "price_max")
+        price_range = None
+        if lo is not None or hi is not None:
+            price_range = (-math.inf if lo is None else lo, math.inf if hi is None else hi)
+        sort_key = _str(params, "sort_key") or "추천순(점수)"
+        if sort_key not in SORT_KEYS:
+            raise RequestError(f"unknown sort_key: {sort_key!r}")
+        limit = _int(params, "limit", DEFAULT_LIMIT, 0, MAX_LIMIT)
+        query = dict(profile_query(index, profile), price_range=price_range,
+                     grain_free=profile["grain_free"], vet_diet=profile["vet_diet"],
+                     favorites=profile["favorites"], dislikes=profile["dislikes"], sort_key=sort_key)
+        page = {"food": _int(params, "food_limit", limit, 0, MAX_LIMIT),
+                "treat": _int(params, "treat_limit", limit, 0, MAX_LIMIT),
+                "offset": _int(params, "offset", 0, 0, len(index.data)), "daily": daily_kcal(profile)}
+        return query, page
+
+    def _answer(self, query, page, total, food, treat):
+        daily = page["daily"]
+        return {
+            "stage": query["stage"],
+            "daily_kcal": daily,
+            "treat_budget_kcal": treat_budget(daily),
+            "sort_key": query["sort_key"],
+            "total": total,
+            "food": food,
+            "treat": treat,
+        }
+
+    def recommend(self, params):
+        index = self.index
+        query, page = self._parse(params)
+        ranking = recommend(index, shared_cache=self.cache, **query)
+        daily, offset = page["daily"], page["offset"]
+        return self._answer(query, page, len(ranking),
+                            self._items(ranking, ranking.mask(index, self._kinds["food"]),
+                                        daily, page["food"], offset, is_treat=False),
+                            self._items(ranking, ranking.mask(index, self._kinds["treat"]),
+                                        daily, page["treat"], offset, is_treat=True))
+
+    def recommend_many(self, requests):
+        """Answers to many requests, in order; an invalid one gives a :class:`RequestError` instead.
+
+        Each request is parsed on its own, so a malformed one fails alone.
+        Requests sorted by score (the default) are ranked together with
+        :func:`~gamja.matrix.rank_many`, the others one at a time.  The
+        answers are the same as :meth:`recommend` gives.
+        """
+        index = self.index
+        parsed = []
+        for params in requests:
+            try:
+                parsed.append(self._parse(params))
+            except RequestError as exc:
+                parsed.append(exc)
+            except (TypeError, ValueError, OverflowError) as exc:  # 한 요청의 오류가 나머지를 막지 않게
+                parsed.append(RequestError(f"invalid request: {exc}"))
+        answers = [p if isinstance(p, RequestError) else None for p in parsed]
+        together = [i for i, p in enumerate(parsed)
+                    if answers[i] is None and SORT_KEYS[p[0]["sort_key"]][0] == "score"]
+        queries = [canonical_query(index, **parsed[i][0]) for i in together]
+        bitmaps = [query_bitmap(index, q) for q in queries]
+        picks = {}
+        for kind in ("food", "treat"):
+            k = max((parsed[i][1]["offset"] + parsed[i][1][kind] for i in together), default=0)
+            picks[kind] = rank_many(index, queries, k, within=self._kinds[kind])
+        for n, i in enumerate(together):
+            query, page = parsed[i]
+            items = {kind: self._items(picks[kind][n], None, page["daily"], page[kind], page["offset"],
+                                       is_treat=kind == "treat",
+                                       total=index.count(bitmaps[n] & self._kinds[kind]))
+                     for kind in ("food", "treat")}
+            answers[i] = self._answer(query, page, index.count(bitmaps[n]), items["food"], items["treat"])
+        for i, answer in enumerate(answers):
+            if answer is None:
+                answers[i] = self.recommend(requests[i])
+        return answers
+
+    def product(self, sku):
+        if self._sku_rows is None:
+            skus = self.index.data["sku"].astype(str).tolist() if "sku" in self.index.data.columns else []
+            self._sku_rows = {s: i for i, s in reversed(list(enumerate(skus)))}  # 중복 sku 는 첫 행
+        row = self._sku_rows.get(sku)
+        if row is None:
+            raise RequestError(f"unknown sku: {sku}", status=404)
+        data = self.index.data
+        return {"id": self.index.item_ids[row], **{c: _jsonable(data[c].iat[row]) for c in data.columns}}
+
+    def facets(self):
+        index = self.index
+        return {
+            "facets": {col: {str(v): n for v, n in index.facet_counts(col).items() if str(v)}
+                       for col in FACET_COLS if col in index.facets},
+            "flags": {col: index.flag_count(col) for col in index.flags},
+            "ranges": {col: index.bounds(col) for col in index.ranges},
+            "sort_keys": [k for k in SORT_KEYS if k is not None],
+            "rows": index.n,
+        }
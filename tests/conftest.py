@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from gamja.catalog import load_catalog  # noqa: E402
+from gamja.index import CatalogIndex  # noqa: E402
+
+CATALOG = ROOT / "catalog.csv"
+
+
+@pytest.fixture(scope="session")
+def catalog():
+    return load_catalog(CATALOG, use_cache=False)
+
+
+@pytest.fixture(scope="session")
+def index(catalog):
+    return CatalogIndex(catalog)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+from urllib.parse import urlencode
+
+import pytest
+
+from gamja.api import App, query_params
+from gamja.service import RecommendService, RequestError, parse_bool, parse_list
+
+
+def call(app, method, path, body=None, query=""):
+    if body is not None and not isinstance(body, bytes):
+        body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    messages = [{"type": "http.request", "body": body or b"", "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode("utf-8")}
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+@pytest.fixture(scope="module")
+def app(index):
+    return App(index=index)
+
+
+PROFILE = {"age": 4, "weight": 4.5, "neutered": "예", "activity": "보통", "conditions": ["체중관리"],
+           "base_allergy": ["닭"], "custom_allergy": "밀", "limit": 5}
+
+
+def test_recommend_post_and_get_agree(app):
+    status, answer = call(app, "POST", "/recommend", PROFILE)
+    assert status == 200
+    assert len(answer["food"]["items"]) == 5 and len(answer["treat"]["items"]) == 5
+    query = urlencode({k: ",".join(v) if isinstance(v, list) else v for k, v in PROFILE.items()})
+    assert call(app, "GET", "/recommend", query=query) == (200, answer)
+
+
+@pytest.mark.parametrize("body, field", [
+    ({"conditions": 5}, "conditions"),
+    ({"conditions": ["체중관리", 5]}, "conditions"),
+    ({"favorites": {"a": 1}}, "favorites"),
+    ({"custom_allergy": 5}, "custom_allergy"),
+    ({"activity": ["보통"]}, "activity"),
+    ({"neutered": True}, "neutered"),
+    ({"sort_key": ["가격 낮은순"]}, "sort_key"),
+    ({"sort_key": "없는 정렬"}, "sort_key"),
+    ({"grain_free": [1]}, "grain_free"),
+    (b'{"limit": 1e400}', "limit"),
+    ({"limit": "many"}, "limit"),
+    ({"offset": [0]}, "offset"),
+    ({"weight": "inf"}, "weight"),
+    ({"age": "three"}, "age"),
+    ({"price_min": "nan"}, "price_min"),
+    ({"price_max": 1e308 * 10}, "price_max"),
+])
+def test_malformed_fields_are_bad_requests(app, body, field):
+    status, answer = call(app, "POST", "/recommend", body)
+    assert status == 400
+    assert field in answer["error"]
+
+
+def test_request_errors(app):
+    assert call(app, "POST", "/recommend", b"{")[0] == 400
+    assert call(app, "POST", "/recommend", [1])[0] == 400
+    assert call(app, "GET", "/products/no-such-sku")[0] == 404
+    assert call(app, "DELETE", "/facets")[0] == 405
+    assert call(app, "GET", "/nowhere")[0] == 404
+
+
+def test_parse_leaves_params_alone(index):
+    service = RecommendService(index)
+    params = {"conditions": "체중관리, 헤어볼", "favorites": ["a,b"], "age": "2", "limit": "3"}
+    before = json.dumps(params, ensure_ascii=False)
+    query, page = service._parse(params)
+    assert json.dumps(params, ensure_ascii=False) == before
+    assert query["conditions"] == ["체중관리", "헤어볼"] and query["favorites"] == ["a", "b"]
+    assert page["food"] == page["treat"] == 3
+
+
+def test_string_numbers_match_numbers(index):
+    service = RecommendService(index)
+    assert service.recommend(dict(PROFILE, age="4", weight="4.5", limit="5")) == service.recommend(PROFILE)
+    with pytest.raises(RequestError):
+        service.recommend({"price_min": float("nan")})
+
+
+def test_field_parsers():
+    assert parse_list(None) == [] and parse_list(" a, b ,") == ["a", "b"] and parse_list(["a,b", "c"]) == ["a", "b", "c"]
+    with pytest.raises(RequestError, match="favorites"):
+        parse_list([1], "favorites")
+    assert [parse_bool(v) for v in ("예", " True", "0", "", 1, None)] == [True, True, False, False, True, False]
+    assert query_params("conditions=a,b&conditions=c&grain_free=yes&age=2") == {
+        "conditions": ["a", "b", "c"], "grain_free": True, "age": "2"}
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import base64
+
+import pytest
+
+from conftest import ROOT
+from gamja import assets
+
+PNG = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg==")
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / "icons").mkdir()
+    (tmp_path / "icons" / "dot.png").write_bytes(PNG)
+    (tmp_path / "icons" / "cat.svg").write_text('<svg xmlns="http://www.w3.org/2000/svg"/>', encoding="utf-8")
+    return tmp_path
+
+
+def test_static_url_links_images_through_app_static(static_dir):
+    url = assets.static_url(static_dir, "icons/dot.png")
+    assert url.startswith("app/static/icons/dot.png?v=") and len(url.split("?v=")[1]) == 12
+    assert assets.static_url(static_dir, "icons/dot.png") == url
+    (static_dir / "icons" / "dot.png").write_bytes(PNG + b"\0")
+    assert assets.static_url(static_dir, "icons/dot.png") != url
+
+
+def test_static_url_inlines_what_app_static_cannot_serve(static_dir):
+    # app/static 은 SVG 를 text/plain 으로 보내므로 data: URI, 정적 서빙이 꺼져 있으면 이미지도
+    assert assets.static_url(static_dir, "icons/cat.svg#cat-1").startswith("data:image/svg+xml;base64,")
+    assert assets.static_url(static_dir, "icons/cat.svg#cat-1").endswith("#cat-1")
+    assert assets.static_url(static_dir, "icons/dot.png", serving=False).startswith("data:image/png;base64,")
+
+
+def test_logo_html(static_dir, tmp_path_factory):
+    missing = tmp_path_factory.mktemp("src") / "missing.png"
+    assert assets.logo_html([missing], static_dir) is None
+    source = static_dir / "icons" / "dot.png"
+    html = assets.logo_html([missing, source], static_dir)
+    if assets.Image is None:
+        assert html.startswith('<img class="brand-logo" src="data:image/png')
+        return
+    assert html.startswith("<picture>") and "app/static/logo/dot-96.webp?v=" in html
+    assert (static_dir / "logo" / "dot-192.png").exists()
+    assert 'src="data:image/png' in assets.logo_html([source], static_dir, serving=False)
+
+
+def test_font_css_respects_offline(monkeypatch):
+    monkeypatch.delenv(assets.OFFLINE_ENV, raising=False)
+    assert assets.font_css() == f"@import url('{assets.GOOGLE_FONTS_URL}');\n"
+    monkeypatch.setenv(assets.OFFLINE_ENV, "1")
+    assert assets.font_css() == ""
+
+
+def test_bundled_fallback_logo():
+    assert assets.static_url(ROOT / "static", "icons/cat.svg").startswith("data:image/svg+xml;base64,")
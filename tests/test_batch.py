@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from gamja.batch import read_profiles, recommend_profiles
+from gamja.service import RecommendService
+
+from conftest import CATALOG
+
+VALID = [
+    {"id": "a", "age": 2, "weight": 4.0, "conditions": ["체중관리"]},
+    {"id": "b", "age": 12, "weight": 5.5, "base_allergy": ["닭"], "sort_key": "가격 낮은순"},
+    {"id": "c", "age": 0.5, "weight": 2.0, "activity": "높음"},
+]
+INVALID = [
+    {"id": "x1", "conditions": 5},
+    {"id": "x2", "activity": ["a"]},
+    {"id": "x3", "weight": "inf"},
+    {"id": "x4", "limit": 1e400, "custom_allergy": 5},
+]
+
+
+def mixed():
+    return [VALID[0], INVALID[0], VALID[1], INVALID[1], INVALID[2], VALID[2], INVALID[3]]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_invalid_profiles_give_error_records(index, workers):
+    profiles = mixed()
+    before = json.dumps(profiles, ensure_ascii=False)
+    records = list(recommend_profiles(profiles, str(CATALOG), top_food=3, top_treat=2, workers=workers,
+                                      chunk_size=4))
+    assert json.dumps(profiles, ensure_ascii=False) == before
+    assert [r["id"] for r in records] == [p["id"] for p in profiles]
+    service = RecommendService(index)
+    for profile, record in zip(profiles, records):
+        if profile in INVALID:
+            assert set(record) == {"id", "error"}
+            continue
+        answer = service.recommend(dict(profile, food_limit=3, treat_limit=2))
+        assert record["food"] == answer["food"]["items"] and record["treat"] == answer["treat"]["items"]
+        assert record["daily_kcal"] == answer["daily_kcal"]
+
+
+def test_read_profiles_reports_bad_lines(tmp_path):
+    path = tmp_path / "profiles.jsonl"
+    path.write_text('{"id": 1, "age": 3}\nnot json\n[1, 2]\n\n{"id": 4}\n', encoding="utf-8")
+    profiles = list(read_profiles(str(path)))
+    assert [p.get("id") for p in profiles] == [1, None, None, 4]
+    records = list(recommend_profiles(profiles, str(CATALOG), top_food=1, top_treat=1))
+    assert [sorted(r) for r in records[1:3]] == [["error", "id"], ["error", "id"]]
+    assert "error" not in records[0] and "error" not in records[3]
+
+
+def test_csv_profiles(tmp_path):
+    path = tmp_path / "profiles.csv"
+    path.write_text("id,age,weight,conditions,allergies\np1,3,4.2,체중관리;헤어볼,닭;밀\np2,abc,4,,\n",
+                    encoding="utf-8")
+    records = list(recommend_profiles(read_profiles(str(path)), str(CATALOG), top_food=2, top_treat=2))
+    assert len(records[0]["food"]) == 2 and "error" not in records[0]
+    assert records[1] == {"id": "p2", "error": "age must be a number"}
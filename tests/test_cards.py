@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import math
+
+from gamja import SHOP_BUTTON, card_grid, card_html
+from gamja.cards import hide, toggle_dislike, toggle_favorite
+
+ROW = {"name": "<치킨> 습식/파우치", "brand": "로열", "texture": "습식/파우치", "protein": "닭", "score": 2.345,
+       "price_tier": "중간", "price_krw": 12900.0, "kcal_per_100g": 80.0, "tags": "저인;<b>",
+       "reasons": ["단백질 선호", "요로 케어"], "product_url": "https://shop.test/p?a=1&b=2"}
+
+
+def test_card_html_escapes_catalog_text():
+    card = card_html(ROW, 240)
+    assert card.startswith("<div class='card-cell'><h3>&lt;치킨&gt; 습식/파우치</h3>") and card.endswith("</div>")
+    assert "<span class='pill tag'>&lt;b&gt;</span>" in card
+    assert 'href="https://shop.test/p?a=1&amp;b=2"' in card
+    assert "\n" not in card  # 마크다운 HTML 블록이 중간에 끊기지 않게
+
+
+def test_card_html_options():
+    v5 = card_html(ROW, 240)
+    assert "권장 1일 급여량(사료): <strong>약 300 g/일</strong>" in v5
+    assert "가격:" not in v5 and "<br/>" not in v5
+    assert "<div class='small muted'>추천 이유: 단백질 선호, 요로 케어</div>" in v5
+    assert "class='shop-link'" in v5
+
+    v6 = card_html(ROW, 240, price=True, pouch_title=True, feed_label="권장 1일 급여량", reasons="details",
+                   link=SHOP_BUTTON)
+    assert "습식<br/><span class='title-sub'>파우치</span>" in v6
+    assert "가격: 12,900원" in v6 and "권장 1일 급여량: <strong>" in v6
+    assert "<details><summary>추천 이유 보기</summary>" in v6 and "🛒 상품 보기" in v6
+    assert "가격: 정보없음" in card_html(dict(ROW, price_krw=math.nan), 240, price=True)
+
+
+def test_treat_card_counts_pieces():
+    treat = dict(ROW, kcal_per_100g=math.nan, treat_kcal_per_piece=2.0, reasons=[], product_url="")
+    card = card_html(treat, 240, is_treat=True)
+    assert "간식 한도 ≈ 24 kcal → <strong>하루 12개</strong> (1개당 2 kcal)" in card
+    assert "급여량" not in card and "추천 이유" not in card and "<a " not in card
+    assert "treat_kcal_per_piece를 넣으면" in card_html(dict(treat, treat_kcal_per_piece=None), 240, is_treat=True)
+
+
+def test_toggles():
+    state = {"favorites": set(), "dislikes": set()}
+    toggle_favorite(state, "a")
+    toggle_favorite(state, "b")
+    toggle_favorite(state, "b")
+    assert state == {"favorites": {"a"}, "dislikes": set()}
+    toggle_dislike(state, "a")
+    assert state == {"favorites": set(), "dislikes": {"a"}}
+    toggle_dislike(state, "a")
+    toggle_favorite(state, "c")
+    hide(state, "c")
+    hide(state, "c")
+    assert state == {"favorites": set(), "dislikes": {"c"}}
+
+
+class _Recorder:
+    """Stands in for the streamlit module: records which column each element lands in."""
+
+    def __init__(self):
+        self.calls, self.where, self.rows = [], (), 0
+
+    def columns(self, n):
+        self.rows += 1
+        return [_Column(self, self.where + ((self.rows, i),)) for i in range(n)]
+
+    def markdown(self, body, unsafe_allow_html=False):
+        self.calls.append((self.where, "markdown", body))
+
+    def button(self, label, key, on_click, args):
+        self.calls.append((self.where, "button", key))
+
+
+class _Column:
+    def __init__(self, st, where):
+        self.st, self.where = st, where
+
+    def __enter__(self):
+        self.outer, self.st.where = self.st.where, self.where
+
+    def __exit__(self, *exc):
+        self.st.where = self.outer
+
+
+def test_card_grid_keeps_buttons_with_their_card():
+    st = _Recorder()
+    state = {"favorites": set(), "dislikes": set()}
+    card_grid(st, ["c1", "c2", "c3", "c4"], ["a", "b", "c", "d"], state, "food")
+    for card, item_id in zip(["c1", "c2", "c3", "c4"], "abcd"):
+        (where, _, _), = [c for c in st.calls if c[2] == card]
+        buttons = [key for w, kind, key in st.calls if kind == "button" and w[:1] == where]
+        assert buttons == [f"fav_food_{item_id}", f"dis_food_{item_id}", f"hide_food_{item_id}"]
+
+    st = _Recorder()
+    card_grid(st, ["c1"], ["a"], state, "favs", show_actions=False)
+    assert st.calls == [(((1, 0),), "markdown", "c1")]
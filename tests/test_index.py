@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pytest
+
+from gamja.allergy import ALLERGY_SYNONYMS, group_terms, normalize_token
+from gamja.filters import apply_filters, filter_bitmap
+
+
+def blob(catalog):
+    # 원래 앱의 알러지 검색 문자열
+    return (catalog["name"].astype(str) + " " + catalog["protein"].astype(str) + " "
+            + catalog["ingredients"].astype(str)).map(normalize_token)
+
+
+def test_facet_bitmaps_match_isin(index, catalog):
+    for col in ("brand", "type", "price_tier", "texture", "protein"):
+        values = sorted(catalog[col].dropna().astype(str).unique())
+        for picked in (values[:1], values[::2], values):
+            want = catalog[col].astype(str).isin(picked).to_numpy()
+            assert np.array_equal(index.mask(index.any_of(col, picked)), want)
+            assert index.count(index.any_of(col, picked)) == want.sum()
+
+
+@pytest.mark.parametrize("lo, hi", [(0, 10**9), (20000, 60000), (None, 30000), (45000, None)])
+def test_filters_match_pandas(index, catalog, lo, hi):
+    brands = sorted(catalog["brand"].unique())[::3]
+    got = apply_filters(index, brands=brands, price_tiers=["저가", "중간"], textures=["드라이"],
+                        price_range=(lo, hi), grain_free=True)
+    price = catalog["price_krw"].fillna(0)
+    want = catalog[catalog["brand"].isin(brands) & catalog["price_tier"].isin(["저가", "중간"])
+                   & (catalog["texture"] == "드라이") & catalog["grain_free"]
+                   & (price >= (lo if lo is not None else -np.inf)) & (price <= (hi if hi is not None else np.inf))]
+    pd.testing.assert_frame_equal(got, want)
+
+
+def test_allergen_groups_match_substring_scan(index, catalog):
+    text = blob(catalog)
+    for group in ALLERGY_SYNONYMS:
+        want = text.map(lambda t: any(term in t for term in group_terms(group))).to_numpy()
+        assert np.array_equal(index.mask(index.allergen_rows([group])), want), group
+    both = index.mask(index.allergen_rows(["닭", "곡물"]))
+    assert np.array_equal(both, index.mask(index.allergen_rows(["닭"])) | index.mask(index.allergen_rows(["곡물"])))
+    kept = index.mask(filter_bitmap(index, exclude_allergens=["어류"]))
+    assert np.array_equal(kept, ~index.mask(index.allergen_rows(["어류"])))
+
+
+def test_free_text_allergy_match(index, catalog):
+    text = blob(catalog)
+    terms = {"연어", "쌀", "감자"}
+    got = index.allergy_text.match(terms=terms, groups=["닭"])
+    for t, found in zip(text, got):
+        hits = [(t.find(x), -len(x), x) for x in terms | group_terms("닭") if x in t]
+        assert found == (min(hits)[2] if hits else None)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import random
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gamja.allergy import ALLERGY_SYNONYMS
+from gamja.index import CatalogIndex
+from gamja.matrix import rank_many
+from gamja.profile import profile_query
+from gamja.recommend import canonical_query, rank
+from gamja.service import RecommendService
+
+CONDITIONS = ["비만 경향", "FLUTD/요로기계", "신장 질환(CKD)", "소화 민감성/IBD", "헤어볼"]
+
+
+def queries(index, n, seed=0):
+    rng = random.Random(seed)
+    ids = list(index.item_ids)
+    out = []
+    for _ in range(n):
+        form = {"age": rng.choice([0.5, 3.0, 12.0]), "activity": rng.choice(["낮음", "보통", "높음"]),
+                "conditions": rng.sample(CONDITIONS, rng.randint(0, 3)),
+                "base_allergy": rng.sample(list(ALLERGY_SYNONYMS), rng.randint(0, 2)),
+                "custom_allergy": rng.choice(["", "연어", "쌀, 감자"]),
+                "sel_prices": rng.choice([[], ["저가"], ["중간", "프리미엄"]]),
+                "sel_proteins": rng.choice([[], ["닭", "어류"]])}
+        out.append(canonical_query(index, **profile_query(index, form),
+                                   price_range=rng.choice([None, (20000, 60000)]), grain_free=rng.random() < .2,
+                                   favorites=rng.sample(ids, 5), dislikes=rng.sample(ids, 5)))
+    return out
+
+
+@pytest.mark.parametrize("budget", [1, 2**20, 64 * 2**20])
+def test_rank_many_matches_rank(index, budget):
+    qs = queries(index, 40)
+    food = index.any_of("type", ["사료"])
+    for within in (None, food):
+        for query, got in zip(qs, rank_many(index, qs, 12, within=within, memory_budget=budget)):
+            full = rank(index, query)
+            where = None if within is None else full.mask(index, within)
+            pos = full.positions(12, where)
+            assert np.array_equal(got.rows[got.positions()], full.rows[pos])
+            assert np.array_equal(got.score[got.positions()], full.score[pos])
+            assert np.array_equal(got.reason_bits[got.positions()], full.reason_bits[pos])
+            assert list(got.allergen_of(got.positions())) == list(full.allergen_of(pos))
+
+
+def test_recommend_many_matches_recommend(index):
+    service = RecommendService(index)
+    requests = [{"age": a, "conditions": c, "base_allergy": b, "limit": 7, "offset": o}
+                for a in (0.5, 4, 12) for c in ([], ["헤어볼"]) for b in ([], ["닭"]) for o in (0, 3)]
+    requests.append({"sort_key": "가격 낮은순", "limit": 4})
+    assert service.recommend_many(requests) == [service.recommend(r) for r in requests]
+
+
+@pytest.mark.parametrize("budget", [4 * 2**20, 16 * 2**20])
+def test_memory_budget_bounds_the_peak(catalog, budget):
+    index = CatalogIndex(pd.concat([catalog] * 20, ignore_index=True))
+    # 알러지 선택이 모두 달라 블록마다 캐시가 가장 커지는 경우
+    qs = [canonical_query(index, **profile_query(index, {"custom_allergy": f"연어{i}, 치킨", "conditions": ["헤어볼"]}),
+                          favorites=list(index.item_ids[i:i + 3])) for i in range(120)]
+    for within in (None, index.any_of("type", ["사료"])):
+        tracemalloc.start()
+        try:
+            rank_many(index, qs, 20, within=within, memory_budget=budget)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        assert peak <= budget
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gamja.allergy import ALLERGY_SYNONYMS, normalize_token
+from gamja.cache import LRUCache
+from gamja.profile import PRICE_TIERS, PROTEINS, TEXTURES, allergy_tokens, profile_query
+from gamja.recommend import SORT_KEYS, Ranking, canonical_query, personalize_table, rank, recommend, top_k
+from gamja.scoring import score_rows, with_reasons
+
+from conftest import CATALOG
+
+CONDITIONS = ["비만 경향", "FLUTD/요로기계", "신장 질환(CKD)", "간 질환", "소화 민감성/IBD", "헤어볼", "치아 문제"]
+SORTS = [k for k in SORT_KEYS if k is not None]
+
+
+@pytest.fixture(scope="module")
+def raw():
+    """The catalog as the apps originally read it (float64 numbers, text as str)."""
+    df = pd.read_csv(CATALOG)
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].astype(str)
+    for col in ("grain_free", "veterinary_diet"):
+        df[col] = df[col].astype(str).str.lower().isin(["true", "1", "y", "yes"])
+    return df
+
+
+def _item_id(row):
+    base = str(row.get("sku") or row.get("name") or f"{row.get('brand')}_{row.get('product_url')}")
+    return f"{base}-{hashlib.md5(base.encode('utf-8')).hexdigest()[:8]}"
+
+
+def _expand(tokens):
+    out = set()
+    for t in tokens:
+        t = normalize_token(t)
+        if not t:
+            continue
+        out.add(t)
+        for group, syns in ALLERGY_SYNONYMS.items():
+            terms = {normalize_token(x) for x in (group, *syns)}
+            if t in terms:
+                out |= terms
+    return out
+
+
+def _selected(selected, all_values):
+    return list(all_values) if not selected or "전체" in selected else [x for x in selected if x != "전체"]
+
+
+def reference(catalog, form, price_range, grain_free, vet_diet, favorites, dislikes, sort_key):
+    """The apps' original filter + per-row scoring loop (before the index and rule columns)."""
+    brands = _selected(form["sel_brands"], sorted(b for b in catalog["brand"].dropna().unique() if b))
+    prices = _selected(form["sel_prices"], PRICE_TIERS)
+    textures = _selected(form["sel_textures"], TEXTURES)
+    proteins = _selected(form["sel_proteins"], PROTEINS)
+    df = catalog[catalog["brand"].isin(brands) & catalog["price_tier"].isin(prices)
+                 & catalog["texture"].isin(textures) & catalog["protein"].isin(proteins)]
+    df = df[(df["price_krw"].fillna(0) >= price_range[0]) & (df["price_krw"].fillna(0) <= price_range[1])]
+    if grain_free:
+        df = df[df["grain_free"]]
+    if vet_diet:
+        df = df[df["veterinary_diet"]]
+    stage = "키튼" if form["age"] < 1 else ("어덜트" if form["age"] < 10 else "시니어")
+    allergies, conds = _expand(allergy_tokens(form)), form["conditions"]
+
+    def score_row(row):
+        score, reasons = 0.0, []
+
+        def hit(weight, reason):
+            nonlocal score
+            score += weight
+            reasons.append(reason)
+
+        def ok(x):
+            return x is not None and x == x
+
+        if row["price_tier"] in prices:
+            hit(0.5, f"{row['price_tier']} 가격")
+        if row["texture"] in textures:
+            hit(0.5, f"{row['texture']} 형태")
+        if row["protein"] in proteins:
+            hit(0.5, f"{row['protein']} 단백질")
+        tags = set(str(row["tags"]).split(";"))
+        if stage == "키튼" and "키튼" in tags:
+            hit(1.5, "키튼용")
+        if stage == "시니어" and "시니어" in tags:
+            hit(1.5, "시니어용")
+        kcal, moisture = row["kcal_per_100g"], row["moisture_pct"]
+        if "비만 경향" in conds and ok(kcal) and kcal <= 330:
+            hit(1.5, "저칼로리")
+        if "FLUTD/요로기계" in conds:
+            if str(row["texture"]).startswith("습식") or (ok(moisture) and moisture >= 70):
+                hit(1.5, "높은 수분")
+            if ok(row["magnesium_mg_per_100kcal"]) and row["magnesium_mg_per_100kcal"] <= 25:
+                hit(1.0, "Mg 낮음")
+        if "신장 질환(CKD)" in conds:
+            if ok(row["phosphorus_pct_dm"]) and row["phosphorus_pct_dm"] <= 0.6:
+                hit(1.0, "낮은 인")
+            if ok(row["sodium_pct_dm"]) and row["sodium_pct_dm"] <= 0.4:
+                hit(0.8, "적절한 Na")
+        if "소화 민감성/IBD" in conds and "소화 민감성" in tags:
+            hit(1.0, "소화에 순함")
+        if "헤어볼" in conds and "헤어볼" in tags:
+            hit(1.0, "헤어볼 관리")
+        if form["activity"] == "높음" and ok(kcal) and kcal >= 360:
+            hit(0.7, "활동량 높음 적합")
+        if "고단백" in tags:
+            hit(0.6, "고단백")
+        text = normalize_token(" ".join([str(row["name"]), str(row["protein"]), str(row["ingredients"])]))
+        if any(a in text for a in allergies):
+            hit(-5, "알러지")
+        if _item_id(row) in dislikes:
+            hit(-2, "비선호 항목")
+        if _item_id(row) in favorites:
+            hit(0.5, "즐겨찾기 가산")
+        return score, reasons
+
+    scored = [score_row(row) for _, row in df.iterrows()]
+    df = df.assign(score=[s for s, _ in scored], reasons=[r for _, r in scored])
+    col, ascending = SORT_KEYS[sort_key]
+    return df.sort_values(col, ascending=ascending, na_position="last", kind="stable")
+
+
+def cases(catalog, n, seed=7):
+    rng = random.Random(seed)
+    brands = sorted(catalog["brand"].unique())
+    ids = [_item_id(row) for _, row in catalog.iterrows()]
+    for _ in range(n):
+        form = {"age": rng.choice([0.5, 3.0, 12.0]), "weight": rng.choice([2.0, 4.0, 6.5]),
+                "neutered": rng.choice(["예", "아니오"]), "activity": rng.choice(["낮음", "보통", "높음"]),
+                "conditions": rng.sample(CONDITIONS, rng.randint(0, 4)),
+                "base_allergy": rng.sample(list(ALLERGY_SYNONYMS), rng.randint(0, 2)),
+                "custom_allergy": rng.choice(["", "연어", "치킨, 쌀", "현미", "감자 ,  밀", "Chicken"]),
+                "sel_brands": rng.choice([["전체"], [], rng.sample(brands, 3)]),
+                "sel_prices": rng.choice([["전체"], ["저가"], ["중간", "프리미엄"]]),
+                "sel_textures": rng.choice([["전체"], ["드라이"], ["습식/파우치"]]),
+                "sel_proteins": rng.choice([["전체"], ["닭", "어류"], ["양"]])}
+        yield (form, rng.choice([(0, 10**9), (20000, 60000), (0, 30000)]), rng.random() < .3, rng.random() < .3,
+               set(rng.sample(ids, 15)), set(rng.sample(ids, 15)), rng.choice(SORTS))
+
+
+def _kwargs(index, form, price_range, grain_free, vet_diet, favorites, dislikes, sort_key):
+    return dict(profile_query(index, form), price_range=price_range, grain_free=grain_free, vet_diet=vet_diet,
+                favorites=favorites, dislikes=dislikes, sort_key=sort_key)
+
+
+def test_matches_original_scoring(index, raw):
+    cache, shared = LRUCache(maxsize=8), LRUCache(maxsize=64, max_bytes=200_000)
+    for case in cases(raw, 60):
+        want = reference(raw, *case)
+        ranking = recommend(index, cache=cache, shared_cache=shared, **_kwargs(index, *case))
+        got = with_reasons(ranking.frame(index))
+        assert list(got.index) == list(want.index), case
+        assert got["score"].tolist() == want["score"].tolist()
+        reasons = [["알러지" if r.endswith(" 포함") else r for r in rs] for rs in got["reasons"]]
+        assert reasons == want["reasons"].tolist()
+        food = ranking.mask(index, index.any_of("type", ["사료"]))
+        for k in (0, 1, 7, 40):
+            assert list(ranking.frame(index, top=k).index) == list(want.index[:k])
+            assert list(ranking.frame(index, top=k, where=food).index) == list(want[want["type"] == "사료"].index[:k])
+
+
+@pytest.mark.parametrize("allergies", [{}, {"allergy_groups": ["닭"], "allergy_terms": ["연어"]}])
+def test_unfiltered_rank_matches_scoring_every_row(index, allergies):
+    # 필터가 없으면 규칙 표를 행 위치로 모으지 않고 그대로 읽는다: 결과는 모든 행을 골라 계산한 것과 같아야 한다
+    query = canonical_query(index, stage="시니어", conditions=["FLUTD/요로기계"], **allergies)
+    ranking = rank(index, query)
+    rows = np.arange(index.n)
+    score, bits, allergen = score_rows(
+        index.rule_features, rows, stage="시니어", conditions=["FLUTD/요로기계"], allergy_text=index.allergy_text.take(rows),
+        allergy_groups=allergies.get("allergy_groups", ()), allergy_terms=allergies.get("allergy_terms", ()))
+    assert np.array_equal(ranking.rows, rows)
+    assert np.array_equal(ranking.score, score) and np.array_equal(ranking.reason_bits, bits)
+    if allergies:
+        assert list(ranking.allergen_of(rows)) == list(allergen) and pd.notna(allergen).any()
+    else:
+        assert ranking.allergen is None and allergen is None
+        assert list(ranking.allergen_of(rows[:3])) == [None] * 3
+
+
+def test_top_k_matches_stable_argsort():
+    rng = np.random.default_rng(0)
+    key = rng.integers(0, 20, 500).astype(np.float64)
+    key[rng.integers(0, 500, 40)] = np.nan
+    full = np.argsort(key, kind="stable")
+    for k in (None, 0, 1, 5, 37, 460, 480, 499, 500, 800):
+        assert np.array_equal(top_k(key, k), full[:k])
+
+
+@pytest.mark.parametrize("share", [0.002, 0.3, 1.0])
+def test_streamed_positions_match_a_stable_sort(share):
+    rng = np.random.default_rng(1)
+    values = rng.integers(0, 50, 20_000).astype(np.float64)
+    values[rng.random(len(values)) < 0.05] = np.nan
+    perm = np.argsort(values, kind="stable").astype(np.int32)
+    rows = np.flatnonzero(rng.random(len(values)) < share)
+    n = len(rows)
+    ranking = Ranking(rows, np.zeros(n), np.zeros(n, dtype=np.int32), np.full(n, None, dtype=object), None, perm)
+    where = rng.random(n) < 0.5
+    for mask in (None, where):
+        cand = np.arange(n) if mask is None else np.flatnonzero(mask)
+        want = cand[np.argsort(values[rows[cand]], kind="stable")]
+        assert np.array_equal(ranking.positions(where=mask), want)
+        for top in (0, 1, 10, 300, n + 5):
+            assert np.array_equal(ranking.positions(top, mask), want[:top])
+
+
+def test_streamed_positions_with_the_result_at_the_tail_of_the_permutation():
+    # 결과 행이 정렬 순서의 맨 뒤에 몰린 경우 (예: 가격 낮은순에서 비싼 사료만 남은 필터)
+    values = np.arange(50_000, dtype=np.float64)
+    perm = np.argsort(values, kind="stable").astype(np.int32)
+    rows = np.arange(49_000, 50_000)
+    n = len(rows)
+    ranking = Ranking(rows, np.zeros(n), np.zeros(n, dtype=np.int32), np.full(n, None, dtype=object), None, perm)
+    where = np.arange(n) % 3 == 0
+    assert np.array_equal(ranking.positions(30), np.arange(30))
+    assert np.array_equal(ranking.positions(30, where), np.flatnonzero(where)[:30])
+    assert np.array_equal(ranking.positions(n + 5, where), np.flatnonzero(where))
+
+
+def test_cached_rankings_are_not_modified_by_reads(index, catalog):
+    shared = LRUCache(maxsize=64)
+    for form, price_range, grain_free, vet_diet, favorites, dislikes, sort_key in cases(catalog, 20, seed=1):
+        kwargs = _kwargs(index, form, price_range, grain_free, vet_diet, (), (), sort_key)
+        ranking = recommend(index, shared_cache=shared, **kwargs)
+        size = ranking.nbytes
+        ranking.frame(index)
+        ranking.frame(index, top=5, where=ranking.mask(index, index.any_of("type", ["간식"])))
+        ranking.order()
+        assert ranking.nbytes == size
+        assert recommend(index, shared_cache=shared, **kwargs) is ranking
+    assert shared.nbytes == sum(entry[1].nbytes for entry in shared._data.values())
+
+
+def test_shared_cache_respects_max_bytes(index, catalog):
+    shared = LRUCache(maxsize=1000, max_bytes=20_000)
+    for case in cases(catalog, 40, seed=2):
+        recommend(index, shared_cache=shared, **_kwargs(index, *case))
+        assert shared.nbytes <= 20_000
+        assert shared.nbytes == sum(entry[1].nbytes for entry in shared._data.values())
+    assert shared.evictions > 0
+
+
+def test_session_cache_evicts_by_size(index, catalog):
+    # 즐겨찾기를 하나씩 누를 때마다 세션 캐시에 새 순위가 들어간다
+    shared = LRUCache(maxsize=8)
+    form = next(cases(catalog, 1))[0]
+    base = recommend(index, shared_cache=shared, **_kwargs(index, form, (0, 10**9), False, False, (), (), None))
+    session = LRUCache(maxsize=16, max_bytes=int(3.5 * base.nbytes))
+    ids = list(index.item_ids[base.rows[:10]])
+    for n in range(1, 11):
+        ranking = recommend(index, cache=session, shared_cache=shared,
+                            **_kwargs(index, form, (0, 10**9), False, False, ids[:n], (), None))
+        assert session.nbytes <= session.max_bytes
+        assert session.nbytes == sum(entry[1].nbytes for entry in session._data.values())
+    assert len(session) == 3 and session.evictions == 7
+    assert session.get(next(reversed(session._data))) is ranking
+
+
+@pytest.mark.parametrize("sort_key", ["가격 낮은순", "kcal 높은순"])
+def test_personalized_rankings_share_the_base(index, catalog, sort_key):
+    shared = LRUCache(maxsize=8)
+    form = next(cases(catalog, 1))[0]
+    base = recommend(index, shared_cache=shared, **_kwargs(index, form, (0, 10**9), False, False, (), (), sort_key))
+    ids = list(index.item_ids[base.rows[:10]])
+    mine = recommend(index, shared_cache=shared,
+                     **_kwargs(index, form, (0, 10**9), False, False, ids[:5], ids[5:10], sort_key))
+    assert mine.rows is base.rows and len(shared) == 1
+    assert not np.array_equal(mine.score, base.score)
+
+
+def test_personalized_table_matches_decoding_everything(index, catalog):
+    shared = LRUCache(maxsize=8)
+    form = next(cases(catalog, 1))[0]
+    kwargs = _kwargs(index, form, (0, 10**9), False, False, (), (), "추천순(점수)")
+    base = recommend(index, shared_cache=shared, **kwargs)
+    table = with_reasons(base.frame(index, ordered=False))
+    ids = list(index.item_ids[base.rows[::50]])
+    mine = recommend(index, shared_cache=shared,
+                     **_kwargs(index, form, (0, 10**9), False, False, ids[:4], ids[4:8], "추천순(점수)"))
+    got = personalize_table(table, index, mine, mine.with_ids(index, ids[:8]))
+    pd.testing.assert_frame_equal(got, with_reasons(mine.frame(index, ordered=False)))
+    assert personalize_table(table, index, base, base.with_ids(index, [])) is table
+
+
+def test_recommend_export_is_the_function_whatever_the_import_order():
+    import subprocess
+    import sys
+
+    from conftest import ROOT
+
+    code = "from gamja import personalize_table, recommend; print(callable(recommend))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "True"
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Load-test a running recommendation API (gamja.api).
+
+    python tools/load_test.py [--url http://127.0.0.1:8000] [--concurrency 200] [--requests 5000]
+
+Opens ``--concurrency`` keep-alive connections and sends ``--requests``
+requests in total, a mix of ``POST /recommend`` with random profiles built
+from ``/facets``, ``GET /products/{sku}`` and ``GET /facets``.  Prints
+throughput, latency percentiles and errors.  Standard library only.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import quote, urlsplit
+
+CONDITIONS = ["비만 경향", "FLUTD/요로기계", "신장 질환(CKD)", "소화 민감성/IBD", "헤어볼"]
+ALLERGIES = ["닭", "소", "어류", "오리", "양", "칠면조", "계란", "유제품", "곡물"]
+
+
+class Connection:
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = b"" if body is None else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\n\r\n")
+        self.writer.write(head.encode("latin-1") + payload)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length, close = 0, False
+        while True:
+            line = (await self.reader.readline()).strip()
+            if not line:
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+            elif name.lower() == "connection" and value.strip().lower() == "close":
+                close = True
+        data = await self.reader.readexactly(length)
+        if close:
+            self.close()
+        return status, data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def random_profile(rng, facets):
+    brands = list(facets["facets"].get("brand", {}))
+    return {
+        "age": rng.choice([0.5, 3, 7, 12]), "weight": round(rng.uniform(2.5, 7.5), 1),
+        "neutered": rng.choice(["예", "아니오"]), "activity": rng.choice(["낮음", "보통", "높음"]),
+        "conditions": rng.sample(CONDITIONS, rng.randint(0, 2)),
+        "base_allergy": rng.sample(ALLERGIES, rng.randint(0, 2)),
+        "sel_brands": rng.sample(brands, min(len(brands), rng.randint(0, 3))),
+        "sort_key": rng.choice(facets["sort_keys"]), "limit": rng.choice([3, 9, 12]),
+    }
+
+
+async def worker(conn, jobs, latencies, errors):
+    while jobs:
+        method, path, body = jobs.pop()
+        start = time.perf_counter()
+        try:
+            status, _ = await conn.request(method, path, body)
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as exc:
+            errors[type(exc).__name__] = errors.get(type(exc).__name__, 0) + 1
+            conn.close()
+            continue
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            errors[status] = errors.get(status, 0) + 1
+
+
+async def run(url, concurrency, total, seed):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    probe = Connection(host, port)
+    facets = json.loads((await probe.request("GET", "/facets"))[1])
+    status, data = await probe.request("POST", "/recommend", {"limit": 120})
+    probe.close()
+    picks = json.loads(data)
+    skus = [item["sku"] for kind in ("food", "treat") for item in picks[kind]["items"] if item.get("sku")]
+    rng = random.Random(seed)
+    jobs = []
+    for _ in range(total):
+        r = rng.random()
+        if r < 0.8 or not skus:
+            jobs.append(("POST", "/recommend", random_profile(rng, facets)))
+        elif r < 0.95:
+            jobs.append(("GET", "/products/" + quote(rng.choice(skus)), None))
+        else:
+            jobs.append(("GET", "/facets", None))
+    latencies, errors = [], {}
+    conns = [Connection(host, port) for _ in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(c, jobs, latencies, errors) for c in conns))
+    elapsed = time.perf_counter() - start
+    for c in conns:
+        c.close()
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000 if latencies else float("nan")
+
+    print(f"{len(latencies)} responses in {elapsed:.2f}s = {len(latencies) / elapsed:.0f} req/s "
+          f"(concurrency {concurrency})")
+    print(f"latency ms: p50 {pct(50):.1f}  p95 {pct(95):.1f}  p99 {pct(99):.1f}  max {pct(100):.1f}")
+    print("errors:", errors or "none")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.concurrency, args.requests, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Print catalog memory per row before/after the typed schema.
+
+    python tools/memory_report.py [catalog.csv] [--rows 1000000]
+
+"before" is the frame the apps used to keep (object strings, int64/float64
+numbers); "after" is the same data converted with ``CATALOG_SCHEMA``.  The
+synthetic catalog repeats the real rows with unique skus.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from gamja.catalog import apply_schema, normalize_catalog  # noqa: E402
+
+
+def synthetic_catalog(base, rows):
+    reps = -(-rows // len(base))
+    df = pd.concat([base] * reps, ignore_index=True).iloc[:rows].copy()
+    df["sku"] = df["sku"] + "-" + pd.Series(np.arange(rows) // len(base)).astype(str)
+    return df
+
+
+def report(label, df):
+    rows = len(df)
+    before = df.memory_usage(deep=True).sum()
+    after = apply_schema(df).memory_usage(deep=True).sum()
+    print(f"{label:<22}{rows:>10,} rows  before {before / rows:8.1f} B/row ({before / 2**20:8.1f} MiB)"
+          f"  after {after / rows:8.1f} B/row ({after / 2**20:8.1f} MiB)  x{before / after:.2f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("csv", nargs="?", default="catalog.csv")
+    ap.add_argument("--rows", type=int, default=1_000_000, help="synthetic catalog size (0 to skip)")
+    args = ap.parse_args()
+
+    base = normalize_catalog(pd.read_csv(args.csv))
+    report(Path(args.csv).name, base.copy())
+    if args.rows:
+        report("synthetic", synthetic_catalog(base, args.rows))
+
+
+if __name__ == "__main__":
+    main()